@@ -1,18 +1,35 @@
 import os
-import io
+import queue
 import threading
+from collections import deque
 from datetime import datetime
-from tkinter import Tk, Label, Entry, Button, StringVar, Frame, filedialog, Text, Scrollbar, VERTICAL, RIGHT, Y, END
+from tkinter import Tk, Label, Entry, Button, Checkbutton, StringVar, BooleanVar, Frame, filedialog, Text, Scrollbar, VERTICAL, RIGHT, Y, END
 from tkinter import ttk
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from drivebackup import (
+    DriveBackup, parse_user_list, DEFAULT_CONCURRENCY, DEFAULT_CHUNK_SIZE_MB, DEFAULT_PARALLEL_USERS,
+    DEFAULT_GLOBAL_LIMIT, DEFAULT_EXPORT_CONCURRENCY, DEFAULT_VOLUME_SIZE_MB, ARCHIVE_FORMATS, BACKUP_ORDERS,
+    LOG_FILE_NAME, BackupSelection
+)
+
+# How often (ms) the Tk thread drains log/progress updates posted by worker threads (10 frames a second)
+UI_POLL_INTERVAL_MS = 100
+
+# Output choice for a plain folder tree rather than archive volumes
+FOLDER_OUTPUT = "Folders"
+
+# Order choice for processing files in whatever order Drive lists them
+DEFAULT_ORDER = "Default"
+
+# Lines kept in the log area; the full log is in the log file in the backup directory
+MAX_LOG_LINES = 5000
 
 class DriveBackupApp:
+    """Tk front end for the backup engine in drivebackup.py."""
+    
     def __init__(self, root):
         self.root = root
         self.root.title("Google Drive Backup Tool")
-        self.root.geometry("700x650")
+        self.root.geometry("860x840")
         self.root.resizable(True, True)
         
         # Variables
@@ -21,14 +38,43 @@ class DriveBackupApp:
         self.user_email = StringVar()
         self.backup_dir = StringVar()
         self.specific_file_names = StringVar()
+        self.concurrency = StringVar()
+        self.chunk_size_mb = StringVar()
+        self.incremental = BooleanVar()
+        self.deduplicate = BooleanVar()
+        self.export_concurrency = StringVar()
+        self.extra_export_formats = StringVar()
+        self.archive_format = StringVar()
+        self.volume_size_mb = StringVar()
+        self.owned_only = BooleanVar()
+        self.skip_trashed = BooleanVar()
+        self.modified_after = StringVar()
+        self.order = StringVar()
+        self.bulk_users = StringVar()
+        self.parallel_users = StringVar()
+        self.global_limit = StringVar()
         self.backup_status = "Ready"
         
+        # Log and progress updates from background threads are queued here and applied on the Tk thread
+        self.ui_queue = queue.Queue()
+        
         # Default values
         self.admin_email.set("jesson.estallo@ubiquity.com")
         self.backup_dir.set(os.path.expanduser("~/DriveBackups"))
+        self.concurrency.set(str(DEFAULT_CONCURRENCY))
+        self.chunk_size_mb.set(str(DEFAULT_CHUNK_SIZE_MB))
+        self.export_concurrency.set(str(DEFAULT_EXPORT_CONCURRENCY))
+        self.archive_format.set(FOLDER_OUTPUT)
+        self.volume_size_mb.set(str(DEFAULT_VOLUME_SIZE_MB))
+        self.order.set(DEFAULT_ORDER)
+        self.parallel_users.set(str(DEFAULT_PARALLEL_USERS))
+        self.global_limit.set(str(DEFAULT_GLOBAL_LIMIT))
         
         # Create UI
         self.create_widgets()
+        
+        # Start draining the UI queue
+        self.root.after(UI_POLL_INTERVAL_MS, self.process_ui_queue)
     
     def create_widgets(self):
         # Create main frame
@@ -58,9 +104,64 @@ class DriveBackupApp:
         Entry(main_frame, textvariable=self.specific_file_names, width=50).grid(row=4, column=1, padx=5, pady=5, sticky="ew")
         Label(main_frame, text="(comma separated)", font=("Arial", 8)).grid(row=4, column=2, sticky="w", pady=5)
         
+        # Download options
+        Label(main_frame, text="Options:", anchor="w").grid(row=5, column=0, sticky="w", pady=5)
+        options_frame = Frame(main_frame)
+        options_frame.grid(row=5, column=1, columnspan=2, sticky="w", pady=5)
+        Label(options_frame, text="Concurrent Downloads:").pack(side="left")
+        Entry(options_frame, textvariable=self.concurrency, width=5).pack(side="left", padx=5)
+        Label(options_frame, text="Chunk Size (MB):").pack(side="left", padx=(10, 0))
+        Entry(options_frame, textvariable=self.chunk_size_mb, width=5).pack(side="left", padx=5)
+        Checkbutton(options_frame, text="Incremental", variable=self.incremental).pack(side="left", padx=(10, 0))
+        Checkbutton(options_frame, text="Deduplicate", variable=self.deduplicate).pack(side="left", padx=(10, 0))
+        
+        # Google Docs/Sheets/Slides export options
+        Label(main_frame, text="Export Options:", anchor="w").grid(row=6, column=0, sticky="w", pady=5)
+        export_options_frame = Frame(main_frame)
+        export_options_frame.grid(row=6, column=1, columnspan=2, sticky="w", pady=5)
+        Label(export_options_frame, text="Export Workers:").pack(side="left")
+        Entry(export_options_frame, textvariable=self.export_concurrency, width=5).pack(side="left", padx=5)
+        Label(export_options_frame, text="Extra Formats:").pack(side="left", padx=(10, 0))
+        Entry(export_options_frame, textvariable=self.extra_export_formats, width=15).pack(side="left", padx=5)
+        Label(export_options_frame, text="(e.g. pdf,odt)", font=("Arial", 8)).pack(side="left")
+        
+        # Full backups can go into archive volumes instead of a folder tree
+        Label(main_frame, text="Output:", anchor="w").grid(row=7, column=0, sticky="w", pady=5)
+        output_frame = Frame(main_frame)
+        output_frame.grid(row=7, column=1, columnspan=2, sticky="w", pady=5)
+        ttk.Combobox(output_frame, textvariable=self.archive_format, values=(FOLDER_OUTPUT,) + ARCHIVE_FORMATS,
+                     state="readonly", width=8).pack(side="left")
+        Label(output_frame, text="Volume Size (MB):").pack(side="left", padx=(10, 0))
+        Entry(output_frame, textvariable=self.volume_size_mb, width=7).pack(side="left", padx=5)
+        
+        # Which files a full backup takes, and in which order
+        Label(main_frame, text="Selection:", anchor="w").grid(row=8, column=0, sticky="w", pady=5)
+        selection_frame = Frame(main_frame)
+        selection_frame.grid(row=8, column=1, columnspan=2, sticky="w", pady=5)
+        Checkbutton(selection_frame, text="Owned Only", variable=self.owned_only).pack(side="left")
+        Checkbutton(selection_frame, text="Skip Trashed", variable=self.skip_trashed).pack(side="left", padx=(10, 0))
+        Label(selection_frame, text="Modified After:").pack(side="left", padx=(10, 0))
+        Entry(selection_frame, textvariable=self.modified_after, width=11).pack(side="left", padx=5)
+        Label(selection_frame, text="Order:").pack(side="left", padx=(10, 0))
+        ttk.Combobox(selection_frame, textvariable=self.order, values=(DEFAULT_ORDER,) + tuple(BACKUP_ORDERS),
+                     state="readonly", width=9).pack(side="left", padx=5)
+        
+        # Bulk backup users
+        Label(main_frame, text="Bulk Users:", anchor="w").grid(row=9, column=0, sticky="w", pady=5)
+        Entry(main_frame, textvariable=self.bulk_users, width=50).grid(row=9, column=1, padx=5, pady=5, sticky="ew")
+        Button(main_frame, text="Browse", command=self.browse_bulk_users).grid(row=9, column=2, padx=5, pady=5)
+        
+        Label(main_frame, text="Bulk Options:", anchor="w").grid(row=10, column=0, sticky="w", pady=5)
+        bulk_options_frame = Frame(main_frame)
+        bulk_options_frame.grid(row=10, column=1, columnspan=2, sticky="w", pady=5)
+        Label(bulk_options_frame, text="Parallel Users:").pack(side="left")
+        Entry(bulk_options_frame, textvariable=self.parallel_users, width=5).pack(side="left", padx=5)
+        Label(bulk_options_frame, text="Global Download Limit:").pack(side="left", padx=(10, 0))
+        Entry(bulk_options_frame, textvariable=self.global_limit, width=5).pack(side="left", padx=5)
+        
         # Button frame for multiple buttons
         button_frame = Frame(main_frame)
-        button_frame.grid(row=5, column=0, columnspan=3, pady=15)
+        button_frame.grid(row=11, column=0, columnspan=3, pady=15)
         
         # Start Backup button
         Button(button_frame, text="Start Full Backup", command=self.start_backup, bg="#4CAF50", fg="white", 
@@ -70,17 +171,29 @@ class DriveBackupApp:
         Button(button_frame, text="Download Specific Files", command=self.download_specific_files, bg="#2196F3", fg="white", 
                height=2, width=20).pack(side="left", padx=10)
         
+        # Bulk Backup button
+        Button(button_frame, text="Bulk Backup", command=self.start_bulk_backup, bg="#FF9800", fg="white", 
+               height=2, width=15).pack(side="left", padx=10)
+        
+        # Shared Drives button
+        Button(button_frame, text="Backup Shared Drives", command=self.start_shared_drives_backup, bg="#009688",
+               fg="white", height=2, width=18).pack(side="left", padx=10)
+        
+        # Verify Backup button
+        Button(button_frame, text="Verify Backup", command=self.start_verify_backup, bg="#9C27B0", fg="white", 
+               height=2, width=15).pack(side="left", padx=10)
+        
         # Progress bar
-        Label(main_frame, text="Progress:").grid(row=6, column=0, sticky="w", pady=5)
+        Label(main_frame, text="Progress:").grid(row=12, column=0, sticky="w", pady=5)
         self.progress_bar = ttk.Progressbar(main_frame, orient="horizontal", length=400, mode="determinate")
-        self.progress_bar.grid(row=6, column=1, columnspan=2, sticky="ew", pady=5)
+        self.progress_bar.grid(row=12, column=1, columnspan=2, sticky="ew", pady=5)
         
         # Status label
-        Label(main_frame, text="Status:").grid(row=7, column=0, sticky="nw", pady=5)
+        Label(main_frame, text="Status:").grid(row=13, column=0, sticky="nw", pady=5)
         
         # Log area with scrollbar
         log_frame = Frame(main_frame)
-        log_frame.grid(row=7, column=1, columnspan=2, sticky="nsew", pady=5)
+        log_frame.grid(row=13, column=1, columnspan=2, sticky="nsew", pady=5)
         
         scrollbar = Scrollbar(log_frame, orient=VERTICAL)
         scrollbar.pack(side=RIGHT, fill=Y)
@@ -91,12 +204,15 @@ class DriveBackupApp:
         
         # Configure grid weights for resizing
         main_frame.grid_columnconfigure(1, weight=1)
-        main_frame.grid_rowconfigure(7, weight=1)
+        main_frame.grid_rowconfigure(13, weight=1)
         
         # Initial log message
         self.log("Welcome to Google Drive Backup Tool")
         self.log("Please fill in all fields and click 'Start Backup'")
         self.log("Or enter specific file names (comma separated) and click 'Download Specific Files'")
+        self.log("Or give a users CSV file or list of emails under 'Bulk Users' and click 'Bulk Backup'")
+        self.log("Click 'Backup Shared Drives' to back up every shared drive the user is a member of")
+        self.log("Click 'Verify Backup' to re-check the checksums of everything under the backup directory")
     
     def browse_service_account(self):
         filename = filedialog.askopenfilename(
@@ -113,32 +229,137 @@ class DriveBackupApp:
             self.backup_dir.set(directory)
             self.log(f"Selected backup directory: {directory}")
     
+    def browse_bulk_users(self):
+        filename = filedialog.askopenfilename(
+            title="Select Users CSV File",
+            filetypes=(("CSV files", "*.csv"), ("All files", "*.*"))
+        )
+        if filename:
+            self.bulk_users.set(filename)
+            self.log(f"Selected users file: {filename}")
+    
     def log(self, message):
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_area.insert(END, f"[{timestamp}] {message}\n")
-        self.log_area.see(END)
-        self.root.update_idletasks()
+        self.append_log(f"[{timestamp}] {message}\n")
     
-    def authenticate_service(self):
-        """Authenticate and build the Drive API service."""
-        try:
-            credentials = service_account.Credentials.from_service_account_file(
-                self.service_account_path.get(), 
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
-            
-            # Use domain-wide delegation to impersonate the user
-            delegated_credentials = credentials.with_subject(self.user_email.get())
-            
-            # Build the Drive API service
-            service = build('drive', 'v3', credentials=delegated_credentials)
-            
-            self.log(f"Successfully authenticated and impersonating user {self.user_email.get()}")
-            return service
+    def append_log(self, line):
+        """Queue a finished log line for the Tk thread; safe to call from any thread."""
+        self.ui_queue.put(('log', line))
+    
+    def set_progress(self, value=None, maximum=None):
+        """Queue a progress bar update for the Tk thread."""
+        self.ui_queue.put(('progress', value, maximum))
+    
+    def run_on_ui_thread(self, callback):
+        """Queue a callable to run on the Tk thread."""
+        self.ui_queue.put(('call', callback))
+    
+    def process_ui_queue(self):
+        """Apply what was queued since the last frame, then reschedule.
         
-        except Exception as e:
-            self.log(f"Authentication error: {str(e)}")
-            return None
+        Progress updates are coalesced so only the latest value is drawn,
+        and of a burst of log lines only those that stay visible are inserted.
+        """
+        try:
+            self.apply_ui_updates()
+        finally:
+            # Keep polling even if an update failed, or the log and progress bar would freeze for good
+            self.root.after(UI_POLL_INTERVAL_MS, self.process_ui_queue)
+    
+    def apply_ui_updates(self):
+        lines = deque(maxlen=MAX_LOG_LINES)
+        value = None
+        maximum = None
+        
+        # Only take what is queued now, so busy workers cannot keep the Tk thread here
+        for _ in range(self.ui_queue.qsize()):
+            try:
+                item = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item[0] == 'log':
+                lines.append(item[1])
+            elif item[0] == 'progress':
+                if item[1] is not None:
+                    value = item[1]
+                if item[2] is not None:
+                    maximum = item[2]
+            elif item[0] == 'call':
+                try:
+                    item[1]()
+                except Exception as e:
+                    self.log(f"Error updating the window: {str(e)}")
+        
+        if maximum is not None:
+            self.progress_bar["maximum"] = maximum
+        if value is not None:
+            self.progress_bar["value"] = value
+        
+        if lines:
+            self.log_area.insert(END, "".join(lines))
+            
+            # Drop the oldest lines beyond the cap (every line ends with a newline)
+            line_count = int(self.log_area.index("end-1c").split(".")[0]) - 1
+            if line_count > MAX_LOG_LINES:
+                self.log_area.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+            self.log_area.see(END)
+    
+    def get_int_option(self, variable, default, description):
+        """Read a positive integer from an option field, falling back to the default."""
+        try:
+            return max(1, int(variable.get()))
+        except ValueError:
+            self.log(f"Invalid {description} '{variable.get()}', using {default}")
+            return default
+    
+    def get_chunk_size_mb(self):
+        """Read the chunk size field, falling back to the default."""
+        try:
+            chunk_size_mb = float(self.chunk_size_mb.get())
+            if chunk_size_mb <= 0:
+                raise ValueError
+        except ValueError:
+            self.log(f"Invalid chunk size '{self.chunk_size_mb.get()}', using {DEFAULT_CHUNK_SIZE_MB} MB")
+            chunk_size_mb = DEFAULT_CHUNK_SIZE_MB
+        return chunk_size_mb
+    
+    def get_selection(self):
+        """Build the file selection from the selection fields, ignoring an invalid date."""
+        modified_after = self.modified_after.get().strip()
+        try:
+            if modified_after:
+                datetime.fromisoformat(modified_after)
+        except ValueError:
+            self.log(f"Invalid modified-after date '{modified_after}', expected e.g. 2024-01-31; ignoring it")
+            modified_after = None
+        return BackupSelection(
+            owned_only=self.owned_only.get(),
+            skip_trashed=self.skip_trashed.get(),
+            modified_after=modified_after,
+            order=None if self.order.get() == DEFAULT_ORDER else self.order.get()
+        )
+    
+    def create_engine(self):
+        """Build a backup engine from the current field values. Call on the Tk thread."""
+        return DriveBackup(
+            self.service_account_path.get(),
+            self.backup_dir.get(),
+            admin_email=self.admin_email.get(),
+            concurrency=self.get_int_option(self.concurrency, DEFAULT_CONCURRENCY, "concurrency"),
+            chunk_size_mb=self.get_chunk_size_mb(),
+            incremental=self.incremental.get(),
+            deduplicate=self.deduplicate.get(),
+            parallel_users=self.get_int_option(self.parallel_users, DEFAULT_PARALLEL_USERS, "parallel users"),
+            global_limit=self.get_int_option(self.global_limit, DEFAULT_GLOBAL_LIMIT, "global download limit"),
+            export_concurrency=self.get_int_option(self.export_concurrency, DEFAULT_EXPORT_CONCURRENCY, "export workers"),
+            extra_export_formats=self.extra_export_formats.get().split(","),
+            archive_format=None if self.archive_format.get() == FOLDER_OUTPUT else self.archive_format.get(),
+            volume_size_mb=self.get_int_option(self.volume_size_mb, DEFAULT_VOLUME_SIZE_MB, "volume size"),
+            selection=self.get_selection(),
+            on_log=self.append_log,
+            on_progress=self.set_progress,
+            log_file=os.path.join(self.backup_dir.get(), LOG_FILE_NAME)
+        )
     
     def download_specific_files(self):
         """Download multiple specific files by name."""
@@ -155,171 +376,17 @@ class DriveBackupApp:
             self.log("Error: Please enter at least one file name to download")
             return
         
-        # Disable buttons during operation
-        self.disable_buttons()
-        
-        # Start download in a separate thread
-        threading.Thread(target=self.run_specific_files_download, daemon=True).start()
+        # Start download in a separate thread; field values are read here, as Tk may only be used from its own thread
+        self.start_task(self.run_specific_files_download, self.user_email.get(),
+                        self.specific_file_names.get().split(','))
     
-    def run_specific_files_download(self):
+    def run_specific_files_download(self, engine, user_email, file_names):
         """Execute the specific files download process."""
         try:
-            # Parse comma-separated file names, strip whitespace
-            file_names = [name.strip() for name in self.specific_file_names.get().split(',') if name.strip()]
-            
-            self.log(f"Found {len(file_names)} file names to search for")
-            
-            if not file_names:
-                self.log("No valid file names provided")
-                return
-            
-            # Reset progress bar
-            self.progress_bar["value"] = 0
-            self.progress_bar["maximum"] = len(file_names)
-            self.root.update_idletasks()
-            
-            # Authenticate
-            service = self.authenticate_service()
-            if not service:
-                self.log("Authentication failed!")
-                return
-            
-            # Prepare backup directory
-            user_backup_dir = os.path.join(
-                self.backup_dir.get(),
-                f"{self.user_email.get().replace('@', '_at_')}",
-                "specific_files"
-            )
-            os.makedirs(user_backup_dir, exist_ok=True)
-            
-            total_files_found = 0
-            total_files_downloaded = 0
-            
-            # Process each file name
-            for file_index, file_name in enumerate(file_names):
-                self.log(f"Processing file name {file_index+1}/{len(file_names)}: {file_name}")
-                
-                # Update progress bar for each file name
-                self.progress_bar["value"] = file_index + 1
-                self.root.update_idletasks()
-                
-                # Search for the file by name
-                query = f"name = '{file_name}'"
-                
-                files = []
-                page_token = None
-                
-                while True:
-                    response = service.files().list(
-                        q=query,
-                        spaces='drive',
-                        fields='nextPageToken, files(id, name, mimeType, parents)',
-                        pageToken=page_token,
-                        includeItemsFromAllDrives=True,
-                        supportsAllDrives=True
-                    ).execute()
-                    
-                    files.extend(response.get('files', []))
-                    page_token = response.get('nextPageToken')
-                    
-                    if not page_token:
-                        break
-                
-                if not files:
-                    self.log(f"No files found with the name: {file_name}")
-                    continue
-                
-                self.log(f"Found {len(files)} files with the name: {file_name}")
-                total_files_found += len(files)
-                
-                # Process each found file
-                all_files_dict = {}
-                for i, file in enumerate(files):
-                    file_id = file['id']
-                    mime_type = file['mimeType']
-                    
-                    # Get parent folder information for path construction
-                    all_parent_files = self.get_all_parent_files(service, file_id)
-                    all_files_dict.update({f['id']: f for f in all_parent_files})
-                    
-                    # Determine file path based on parent folders
-                    relative_path = self.get_file_path(file_id, file['name'], all_files_dict)
-                    full_path = os.path.join(user_backup_dir, relative_path)
-                    
-                    # Create directory if needed
-                    dir_path = os.path.dirname(full_path)
-                    if dir_path:
-                        os.makedirs(dir_path, exist_ok=True)
-                    
-                    self.log(f"Processing file instance {i+1}/{len(files)}: {relative_path}")
-                    
-                    # Handle different types of files
-                    success = False
-                    
-                    # Handle Google Docs, Sheets, Slides, etc.
-                    if mime_type == 'application/vnd.google-apps.document':
-                        export_path = f"{full_path}.docx"
-                        success = self.export_google_doc(service, file_id, 
-                                'application/vnd.openxmlformats-officedocument.wordprocessingml.document', 
-                                export_path)
-                    
-                    elif mime_type == 'application/vnd.google-apps.spreadsheet':
-                        export_path = f"{full_path}.xlsx"
-                        success = self.export_google_doc(service, file_id, 
-                                'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 
-                                export_path)
-                    
-                    elif mime_type == 'application/vnd.google-apps.presentation':
-                        export_path = f"{full_path}.pptx"
-                        success = self.export_google_doc(service, file_id, 
-                                'application/vnd.openxmlformats-officedocument.presentationml.presentation', 
-                                export_path)
-                    
-                    elif mime_type == 'application/vnd.google-apps.drawing':
-                        export_path = f"{full_path}.png"
-                        success = self.export_google_doc(service, file_id, 'image/png', export_path)
-                    
-                    # Regular files
-                    elif 'vnd.google-apps' not in mime_type:
-                        success = self.download_file(service, file_id, full_path)
-                    
-                    else:
-                        self.log(f"Skipping unsupported file type: {mime_type}")
-                    
-                    if success:
-                        total_files_downloaded += 1
-            
-            self.log(f"Download completed! Found {total_files_found} files, successfully downloaded {total_files_downloaded}.")
-            self.log(f"Files saved to: {user_backup_dir}")
-            
-        except Exception as e:
-            self.log(f"Error during download: {str(e)}")
-        
+            engine.download_specific_files(user_email, file_names)
         finally:
             # Re-enable buttons
-            self.enable_buttons()
-    
-    def get_all_parent_files(self, service, file_id):
-        """Get all parent files needed for the path."""
-        try:
-            file_info = service.files().get(
-                fileId=file_id, 
-                fields='id, name, parents',
-                supportsAllDrives=True
-            ).execute()
-            
-            result = [file_info]
-            
-            # Get parents recursively
-            if 'parents' in file_info:
-                for parent_id in file_info['parents']:
-                    parent_files = self.get_all_parent_files(service, parent_id)
-                    result.extend(parent_files)
-            
-            return result
-        except Exception as e:
-            self.log(f"Error getting file info: {str(e)}")
-            return []
+            self.run_on_ui_thread(self.enable_buttons)
     
     def start_backup(self):
         # Validate inputs
@@ -331,11 +398,24 @@ class DriveBackupApp:
             self.log("Error: User email is required")
             return
         
-        # Disable buttons during backup
-        self.disable_buttons()
-        
         # Start backup in a separate thread
-        threading.Thread(target=self.run_backup, daemon=True).start()
+        self.start_task(self.run_backup, self.user_email.get())
+    
+    def start_task(self, target, *args):
+        """Run target(engine, *args) on a worker thread, with the buttons disabled until it is done.
+        
+        The engine is built first, so the buttons stay usable if the settings
+        are rejected.
+        """
+        try:
+            engine = self.create_engine()
+        except Exception as e:
+            self.log(f"Error: {str(e)}")
+            return
+        
+        # Disable buttons during the operation; target re-enables them when it ends
+        self.disable_buttons()
+        threading.Thread(target=target, args=(engine,) + args, daemon=True).start()
     
     def disable_buttons(self):
         """Disable all buttons."""
@@ -363,217 +443,70 @@ class DriveBackupApp:
             for child in widget.winfo_children():
                 self.enable_buttons_in_widget(child)
     
-    def run_backup(self):
-        try:
-            self.log(f"Starting backup for user: {self.user_email.get()}")
-            
-            # Reset progress bar
-            self.progress_bar["value"] = 0
-            self.root.update_idletasks()
-            
-            # Prepare backup directory
-            user_backup_dir = os.path.join(
-                self.backup_dir.get(),
-                f"{self.user_email.get().replace('@', '_at_')}",
-                datetime.now().strftime("%Y-%m-%d")
-            )
-            os.makedirs(user_backup_dir, exist_ok=True)
-            self.log(f"Backup directory: {user_backup_dir}")
-            
-            # Authenticate
-            self.log("Authenticating...")
-            service = self.authenticate_service()
-            if not service:
-                self.log("Authentication failed!")
-                return
-            
-            # Get all files
-            self.log("Fetching file list...")
-            all_files = self.list_all_files(service)
-            
-            if not all_files:
-                self.log("No files found to backup.")
-                return
-            
-            file_count = len(all_files)
-            self.log(f"Found {file_count} files to process.")
-            
-            # Create a dictionary of files for quick lookup
-            files_dict = {file['id']: file for file in all_files}
-            
-            # Set up progress tracking
-            self.progress_bar["maximum"] = file_count
-            
-            # Process each file
-            success_count = 0
-            for i, file in enumerate(all_files):
-                file_id = file['id']
-                file_name = file['name']
-                mime_type = file['mimeType']
-                
-                # Update progress
-                self.progress_bar["value"] = i + 1
-                self.root.update_idletasks()
-                
-                # Determine file path based on parent folders
-                relative_path = self.get_file_path(file_id, file_name, files_dict)
-                full_path = os.path.join(user_backup_dir, relative_path)
-                
-                # Create directory if needed
-                dir_path = os.path.dirname(full_path)
-                if dir_path:
-                    os.makedirs(dir_path, exist_ok=True)
-                
-                self.log(f"Processing {i+1}/{file_count}: {relative_path}")
-                
-                # Handle different types of files
-                success = False
-                
-                # Handle Google Docs, Sheets, Slides, etc.
-                if mime_type == 'application/vnd.google-apps.document':
-                    export_path = f"{full_path}.docx"
-                    success = self.export_google_doc(service, file_id, 'application/vnd.openxmlformats-officedocument.wordprocessingml.document', export_path)
-                
-                elif mime_type == 'application/vnd.google-apps.spreadsheet':
-                    export_path = f"{full_path}.xlsx"
-                    success = self.export_google_doc(service, file_id, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', export_path)
-                
-                elif mime_type == 'application/vnd.google-apps.presentation':
-                    export_path = f"{full_path}.pptx"
-                    success = self.export_google_doc(service, file_id, 'application/vnd.openxmlformats-officedocument.presentationml.presentation', export_path)
-                
-                elif mime_type == 'application/vnd.google-apps.drawing':
-                    export_path = f"{full_path}.png"
-                    success = self.export_google_doc(service, file_id, 'image/png', export_path)
-                
-                elif mime_type == 'application/vnd.google-apps.folder':
-                    # Just create the folder
-                    os.makedirs(full_path, exist_ok=True)
-                    success = True
-                    self.log(f"Created folder: {relative_path}")
-                
-                # Regular files
-                elif 'vnd.google-apps' not in mime_type:
-                    success = self.download_file(service, file_id, full_path)
-                
-                else:
-                    self.log(f"Skipping unsupported file type: {mime_type}")
-                
-                if success:
-                    success_count += 1
-            
-            # Backup completed
-            self.log(f"\nBackup complete! Successfully processed {success_count} out of {file_count} files.")
-            self.log(f"Backup location: {user_backup_dir}")
-            
-        except Exception as e:
-            self.log(f"Error during backup: {str(e)}")
+    def start_bulk_backup(self):
+        # Validate inputs
+        if not self.service_account_path.get():
+            self.log("Error: Service account JSON file is required")
+            return
         
+        if not self.bulk_users.get():
+            self.log("Error: Enter a users CSV file or a comma separated list of users")
+            return
+        
+        # Start backup in a separate thread
+        self.start_task(self.run_bulk_backup, self.bulk_users.get())
+    
+    def run_backup(self, engine, user_email):
+        try:
+            engine.backup_user(user_email)
         finally:
             # Re-enable buttons
-            self.enable_buttons()
+            self.run_on_ui_thread(self.enable_buttons)
     
-    def list_all_files(self, service):
-        """List all files in the user's Drive."""
-        all_files = []
-        page_token = None
-        
+    def run_bulk_backup(self, engine, bulk_users):
+        """Back up every user in the bulk list, several at a time, and write a summary report."""
         try:
-            while True:
-                results = service.files().list(
-                    pageSize=1000,
-                    fields="nextPageToken, files(id, name, mimeType, parents)",
-                    pageToken=page_token,
-                    includeItemsFromAllDrives=True,
-                    supportsAllDrives=True
-                ).execute()
-                
-                items = results.get('files', [])
-                all_files.extend(items)
-                
-                self.log(f"Retrieved {len(all_files)} files so far...")
-                
-                page_token = results.get('nextPageToken')
-                if not page_token:
-                    break
-            
-            return all_files
-        
-        except Exception as e:
-            self.log(f"Error listing files: {str(e)}")
-            return []
+            engine.bulk_backup(parse_user_list(bulk_users))
+        finally:
+            # Re-enable buttons
+            self.run_on_ui_thread(self.enable_buttons)
     
-    def get_file_path(self, file_id, file_name, files_dict, path_cache=None):
-        """Determine the file path based on parent folders."""
-        if path_cache is None:
-            path_cache = {}
-        
-        if file_id in path_cache:
-            return path_cache[file_id]
-        
-        file_info = files_dict.get(file_id)
-        if not file_info:
-            return file_name
-        
-        # Get parent IDs
-        parents = file_info.get('parents', [])
-        
-        if not parents:
-            path = file_name
-        else:
-            parent_id = parents[0]  # Take the first parent
-            parent_info = files_dict.get(parent_id)
-            
-            if not parent_info:
-                path = file_name
-            else:
-                parent_path = self.get_file_path(parent_id, parent_info['name'], files_dict, path_cache)
-                path = os.path.join(parent_path, file_name)
-        
-        path_cache[file_id] = path
-        return path
+    def start_shared_drives_backup(self):
+        # Validate inputs
+        if not self.service_account_path.get():
+            self.log("Error: Service account JSON file is required")
+            return
+        
+        if not self.user_email.get():
+            self.log("Error: User email is required")
+            return
+        
+        # Start backup in a separate thread
+        self.start_task(self.run_shared_drives_backup, self.user_email.get())
     
-    def download_file(self, service, file_id, file_path):
-        """Download a file from Drive."""
+    def run_shared_drives_backup(self, engine, user_email):
+        """Back up each shared drive of the user into its own tree, several at a time (Parallel Users)."""
         try:
-            request = service.files().get_media(fileId=file_id)
-            file_stream = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_stream, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            # Save the file
-            with open(file_path, 'wb') as f:
-                f.write(file_stream.getvalue())
-            
-            self.log(f"Downloaded file successfully")
-            return True
-        except Exception as e:
-            self.log(f"Error downloading file: {str(e)}")
-            return False
+            engine.backup_shared_drives(user_email)
+        finally:
+            # Re-enable buttons
+            self.run_on_ui_thread(self.enable_buttons)
+    
+    def start_verify_backup(self):
+        if not self.backup_dir.get() or not os.path.isdir(self.backup_dir.get()):
+            self.log("Error: Backup directory does not exist")
+            return
+        
+        # Start verification in a separate thread
+        self.start_task(self.run_verify_backup)
     
-    def export_google_doc(self, service, file_id, mime_type, file_path):
-        """Export a Google Document to the specified MIME type."""
+    def run_verify_backup(self, engine):
+        """Re-hash every file in the verification reports under the backup directory, without contacting Drive."""
         try:
-            request = service.files().export_media(fileId=file_id, mimeType=mime_type)
-            file_stream = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_stream, request)
-            
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-            
-            # Save the file
-            with open(file_path, 'wb') as f:
-                f.write(file_stream.getvalue())
-            
-            self.log(f"Exported file successfully")
-            return True
-        except Exception as e:
-            self.log(f"Error exporting file: {str(e)}")
-            return False
+            engine.verify_backup()
+        finally:
+            # Re-enable buttons
+            self.run_on_ui_thread(self.enable_buttons)
 
 if __name__ == "__main__":
     root = Tk()
@@ -0,0 +1,196 @@
+"""Measure backup throughput against a local mock Drive.
+
+Runs DriveBackup.backup_user against benchmarks/mock_drive.py and reports
+files/s, MB/s, API calls per file and peak RSS, so a change to the engine
+can be compared with the numbers from before it:
+    
+    python benchmarks/bench_backup.py --files 2000 --latency 0.02 --json before.json
+    python benchmarks/bench_backup.py --files 2000 --latency 0.02 --baseline before.json
+
+The mock runs in a process of its own, so its memory and CPU time do not
+count towards the engine's.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mock_drive
+from drivebackup import (DriveBackup, RateLimiter, MAX_API_RATE, DEFAULT_CONCURRENCY, DEFAULT_CHUNK_SIZE_MB,
+                         DEFAULT_EXPORT_CONCURRENCY, DEFAULT_RANGE_THRESHOLD_MB, DEFAULT_RANGE_CONNECTIONS)
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then left out
+    resource = None
+
+# User the benchmark backs up; the mock serves the same Drive for anyone
+BENCHMARK_USER = "benchmark@example.com"
+
+# Allowed drop in files/s against --baseline before the benchmark fails
+DEFAULT_MAX_REGRESSION_PERCENT = 10
+
+class BenchmarkBackup(DriveBackup):
+    """DriveBackup that talks to the mock without a service account."""
+    
+    def get_delegated_credentials(self, user_email):
+        from google.auth.credentials import AnonymousCredentials
+        
+        return AnonymousCredentials()
+
+def run_mock_drive(options, port_queue):
+    """Process entry point: serve a generated Drive until terminated."""
+    server = mock_drive.serve(mock_drive.MockDrive(**options))
+    port_queue.put(server.server_port)
+    while True:
+        time.sleep(60)
+
+def call_mock(port, path):
+    request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=b"", method="POST")
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+def get_peak_rss_mb():
+    """Return this process's peak resident set size in MB, or None where unknown."""
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+
+def run_once(args, port):
+    """Back up the mock Drive into a fresh directory and return the measurements."""
+    backup_dir = tempfile.mkdtemp(prefix="drivebackup-bench-")
+    try:
+        engine = BenchmarkBackup("", backup_dir, concurrency=args.concurrency, chunk_size_mb=args.chunk_size_mb,
+                                 export_concurrency=args.export_workers, range_threshold_mb=args.range_threshold_mb,
+                                 range_connections=args.range_connections, on_log=lambda line: None)
+        if args.api_rate:
+            engine.rate_limiter = RateLimiter(rate=args.api_rate, max_rate=max(args.api_rate, MAX_API_RATE))
+        
+        call_mock(port, "/_reset")
+        started = time.perf_counter()
+        report = engine.backup_user(BENCHMARK_USER, show_progress=False)
+        seconds = time.perf_counter() - started
+        stats = call_mock(port, "/_stats")
+        if args.phases:
+            print("\n".join(engine.metrics.get_summary_lines()))
+    finally:
+        shutil.rmtree(backup_dir, ignore_errors=True)
+    
+    if report['status'] != 'ok' or report['failed']:
+        raise RuntimeError(f"Backup did not complete: {report['failed']} files failed {report['error']}")
+    
+    calls = sum(count for endpoint, count in stats['calls'].items() if endpoint != '429')
+    return {
+        'files': report['files'],
+        'seconds': round(seconds, 3),
+        'files_per_second': round(report['files'] / seconds, 1),
+        'mb_per_second': round(stats['bytes_served'] / 1048576 / seconds, 2),
+        'calls_per_file': round(calls / max(1, report['files']), 3),
+        'rate_limited': stats['calls'].get('429', 0),
+        'calls': stats['calls'],
+        'peak_rss_mb': get_peak_rss_mb(),
+    }
+
+def summarize(runs):
+    """Median of every measurement over the runs; peak RSS is the highest seen."""
+    summary = {}
+    for key in ('seconds', 'files_per_second', 'mb_per_second', 'calls_per_file'):
+        summary[key] = statistics.median(run[key] for run in runs)
+    summary['files'] = runs[0]['files']
+    summary['rate_limited'] = sum(run['rate_limited'] for run in runs)
+    summary['peak_rss_mb'] = runs[-1]['peak_rss_mb']
+    return summary
+
+def print_run(label, result):
+    rss = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] is not None else "n/a"
+    print(f"{label:>8}  {result['files']:>6} files  {result['seconds']:>8.2f} s  {result['files_per_second']:>8.1f} files/s  "
+          f"{result['mb_per_second']:>7.2f} MB/s  {result['calls_per_file']:>6.3f} calls/file  "
+          f"{result['rate_limited']:>4} x 429  peak RSS {rss}")
+
+def compare_with_baseline(summary, baseline_path, max_regression_percent):
+    """Print the change against a saved summary. Returns False if files/s dropped too far."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['summary']
+    
+    ok = True
+    print(f"\nAgainst {baseline_path}:")
+    for key in ('files_per_second', 'mb_per_second', 'calls_per_file', 'peak_rss_mb'):
+        if baseline.get(key) and summary.get(key) is not None:
+            change = (summary[key] - baseline[key]) / baseline[key] * 100
+            print(f"  {key}: {baseline[key]} -> {summary[key]} ({change:+.1f}%)")
+    
+    drop = (baseline['files_per_second'] - summary['files_per_second']) / baseline['files_per_second'] * 100
+    if drop > max_regression_percent:
+        print(f"Throughput dropped {drop:.1f}%, more than the allowed {max_regression_percent}%")
+        ok = False
+    if summary['calls_per_file'] > baseline['calls_per_file'] * (1 + max_regression_percent / 100):
+        print("API calls per file went up")
+        ok = False
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backup engine against a local mock Drive.")
+    parser.add_argument("--files", type=int, default=500, help="files in the mock Drive")
+    parser.add_argument("--folders", type=int, default=50, help="folders in the mock Drive")
+    parser.add_argument("--depth", type=int, default=4, help="deepest folder nesting")
+    parser.add_argument("--mean-size-kb", type=int, default=256, help="mean binary file size")
+    parser.add_argument("--size-distribution", choices=mock_drive.SIZE_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--doc-fraction", type=float, default=0.1, help="share of files that are Google Docs")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of API calls answered with 429")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--export-workers", type=int, default=DEFAULT_EXPORT_CONCURRENCY)
+    parser.add_argument("--chunk-size-mb", type=float, default=DEFAULT_CHUNK_SIZE_MB)
+    parser.add_argument("--range-threshold-mb", type=float, default=DEFAULT_RANGE_THRESHOLD_MB)
+    parser.add_argument("--range-connections", type=int, default=DEFAULT_RANGE_CONNECTIONS)
+    parser.add_argument("--api-rate", type=float, help="starting API rate (default: the engine's own)")
+    parser.add_argument("--runs", type=int, default=3, help="backups to run; the median is reported")
+    parser.add_argument("--phases", action="store_true", help="print the engine's timing summary after each run")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--baseline", help="results file from an earlier --json run to compare with")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION_PERCENT,
+                        help="allowed drop in files/s against --baseline, in percent")
+    args = parser.parse_args(argv)
+    
+    options = {
+        'file_count': args.files, 'folder_count': args.folders, 'depth': args.depth,
+        'mean_size': args.mean_size_kb * 1024, 'size_distribution': args.size_distribution,
+        'doc_fraction': args.doc_fraction, 'latency': args.latency, 'error_rate': args.error_rate,
+    }
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=run_mock_drive, args=(options, port_queue), daemon=True)
+    server.start()
+    try:
+        port = port_queue.get(timeout=60)
+        mock_drive.point_client_at(port)
+        
+        runs = []
+        for run in range(1, args.runs + 1):
+            runs.append(run_once(args, port))
+            print_run(f"run {run}", runs[-1])
+        summary = summarize(runs)
+        print_run("median", summary)
+    finally:
+        server.terminate()
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({'options': vars(args), 'summary': summary, 'runs': runs}, f, indent=2)
+    
+    if args.baseline and not compare_with_baseline(summary, args.baseline, args.max_regression):
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Measure how fast roundcubelog's LogHighlighter colors mail log lines.
+
+Compares LogHighlighter.highlight_lines, one regex pass per batch, with
+the per-line approach it replaced (lower-casing each line, several `in`
+checks and one finditer per keyword pattern) on generated Postfix and
+Amavis lines:
+    
+    python benchmarks/bench_highlighter.py --lines 200000 --batch 2000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from roundcubelog import LogHighlighter
+
+# Address the generated lines are searched for
+BENCHMARK_EMAIL = "jane.doe@example.com"
+
+# Same keywords as RoundcubeLogViewer.setup_keyword_patterns
+KEYWORD_PATTERNS = [
+    (r"Passed CLEAN", "clean_pass"),
+    (r"NOQUEUE reject", "reject"),
+    (r"Blocked MTA-BLOCKED", "blocked"),
+    (r"milter-reject", "milter_reject"),
+    (r"User unknown in virtual mailbox table", "unknown_user"),
+]
+
+LINE_TEMPLATES = [
+    "{time} mx1 postfix/smtpd[{pid}]: NOQUEUE reject: RCPT from unknown[203.0.113.{n}]: 550 5.1.1 <{email}>: "
+    "Recipient address rejected: User unknown in virtual mailbox table; from=<bounce@example.org> to=<{email}>",
+    "{time} mx1 amavis[{pid}]: ({pid}-{n}) Passed CLEAN {{RelayedInbound}}, [198.51.100.{n}] <sender@example.org> "
+    "-> <{email}>, Queue-ID: 4F{n}A, mail_id: x{n}, Hits: -1.2, size: {pid}, queued_as: 5B{n}C, 1234 ms",
+    "{time} mx1 postfix/cleanup[{pid}]: 4F{n}A: milter-reject: END-OF-MESSAGE from unknown[192.0.2.{n}]: "
+    "5.7.1 Blocked MTA-BLOCKED; from=<spam@example.net> to=<{email}>",
+    "{time} mx1 postfix/smtp[{pid}]: 4F{n}A: to=<{email}>, relay=imap1[10.0.0.{n}]:24, delay=0.{n}, "
+    "status=sent (250 2.0.0 Ok: queued as completed)",
+    "{time} mx1 dovecot: lmtp({email}): Warning: quota exceeded for mailbox INBOX, session=<{pid}>",
+]
+
+def make_lines(count, seed=1):
+    generator = random.Random(seed)
+    return [generator.choice(LINE_TEMPLATES).format(time=f"Jan 12 10:{i // 60 % 60:02d}:{i % 60:02d}",
+                                                    pid=generator.randint(1000, 99999), n=i % 250,
+                                                    email=BENCHMARK_EMAIL)
+            for i in range(count)]
+
+def highlight_per_line(lines, email):
+    """The replaced approach: separate substring checks and one finditer per keyword, line by line."""
+    results = []
+    for line in lines:
+        base_tags = []
+        lower_line = line.lower()
+        keyword_positions = []
+        for pattern, tag in KEYWORD_PATTERNS:
+            for match in re.finditer(pattern, line):
+                keyword_positions.append((match.start(), match.end(), tag))
+        if "error" in lower_line or "failed" in lower_line or "failure" in lower_line:
+            base_tags.append("error")
+        elif "warning" in lower_line or "warn" in lower_line:
+            base_tags.append("warning")
+        elif "info" in lower_line or "notice" in lower_line:
+            base_tags.append("info")
+        elif "success" in lower_line or "completed" in lower_line:
+            base_tags.append("success")
+        email_pos = None
+        if email in line:
+            start = line.find(email)
+            email_pos = (start, start + len(email))
+        results.append((base_tags, email_pos, keyword_positions))
+    return results
+
+def measure(label, run, line_count, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        run()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    print(f"{label:<24}{best:>8.3f} s{line_count / best:>14,.0f} lines/s")
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the log line highlighter.")
+    parser.add_argument("--lines", type=int, default=100000, help="generated log lines")
+    parser.add_argument("--batch", type=int, default=2000, help="lines per highlight_lines call")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per approach; the best is reported")
+    args = parser.parse_args(argv)
+    
+    lines = make_lines(args.lines)
+    highlighter = LogHighlighter(KEYWORD_PATTERNS, BENCHMARK_EMAIL)
+    
+    def run_batches():
+        for start in range(0, len(lines), args.batch):
+            highlighter.highlight_lines(lines[start:start + args.batch])
+    
+    baseline = measure("per line (old)", lambda: highlight_per_line(lines, BENCHMARK_EMAIL), len(lines), args.repeats)
+    batched = measure(f"batched ({args.batch}/call)", run_batches, len(lines), args.repeats)
+    print(f"speedup: {baseline / batched:.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
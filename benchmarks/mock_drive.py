@@ -0,0 +1,260 @@
+"""Local mock of the Drive v3 endpoints the backup engine uses, for benchmarks.
+
+Serves files.list, files.get (metadata and alt=media with Range support),
+files.export, changes and batch requests for a generated Drive with
+configurable size, folder depth, latency and injected 429 responses.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+DOCUMENT_MIME_TYPE = 'application/vnd.google-apps.document'
+
+# ID Drive returns for "root" in the mock
+ROOT_FOLDER_ID = 'root-folder'
+
+# Size distributions the generated binary files can follow
+SIZE_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+# Block repeated to build file contents, so large files cost no memory up front
+CONTENT_BLOCK_SIZE = 65536
+
+# Largest page files.list returns, as on Drive
+MAX_PAGE_SIZE = 1000
+
+class MockDrive:
+    """A generated Drive: files, folders and Google Docs plus per-endpoint call counts."""
+    
+    def __init__(self, file_count=500, folder_count=50, depth=4, mean_size=262144, size_distribution='lognormal',
+                 doc_fraction=0.1, latency=0.0, error_rate=0.0, seed=1):
+        self.random = random.Random(seed)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.bytes_served = 0
+        self.files = {}
+        
+        # Folders nest at most depth levels below the root
+        folders = [(ROOT_FOLDER_ID, 0)]
+        for i in range(folder_count):
+            parents = [folder for folder in folders if folder[1] < depth]
+            parent_id, level = self.random.choice(parents)
+            folder_id = f'folder{i}'
+            self.files[folder_id] = self.make_file(folder_id, f'Folder {i}', FOLDER_MIME_TYPE, parent_id)
+            folders.append((folder_id, level + 1))
+        
+        for i in range(file_count):
+            file_id = f'file{i}'
+            parent_id = self.random.choice(folders)[0]
+            if self.random.random() < doc_fraction:
+                self.files[file_id] = self.make_file(file_id, f'Doc {i}', DOCUMENT_MIME_TYPE, parent_id)
+                continue
+            
+            file = self.make_file(file_id, f'File {i}.bin', 'application/octet-stream', parent_id)
+            file['size'] = str(self.pick_size(mean_size, size_distribution))
+            file['md5Checksum'] = hashlib.md5(self.read_content(file_id, 0, int(file['size']))).hexdigest()
+            self.files[file_id] = file
+    
+    def make_file(self, file_id, name, mime_type, parent_id):
+        return {'id': file_id, 'name': name, 'mimeType': mime_type, 'parents': [parent_id],
+                'modifiedTime': '2024-01-01T00:00:00.000Z', 'trashed': False}
+    
+    def pick_size(self, mean_size, size_distribution):
+        if size_distribution == 'fixed':
+            return mean_size
+        if size_distribution == 'uniform':
+            return self.random.randint(0, mean_size * 2)
+        # Many small files and a long tail of large ones, like real Drives
+        sigma = 1.5
+        return int(self.random.lognormvariate(0, sigma) * mean_size / 3.08)
+    
+    def read_content(self, file_id, start, end):
+        """Return bytes start..end (exclusive) of a file's deterministic content."""
+        block = hashlib.sha256(file_id.encode()).digest() * (CONTENT_BLOCK_SIZE // 32)
+        offset = start % CONTENT_BLOCK_SIZE
+        repeats = (offset + end - start) // CONTENT_BLOCK_SIZE + 1
+        return (block * repeats)[offset:offset + end - start]
+    
+    def count(self, endpoint, sent_bytes=0):
+        with self.lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            self.bytes_served += sent_bytes
+    
+    def stats(self):
+        with self.lock:
+            return {'calls': dict(self.calls), 'bytes_served': self.bytes_served}
+    
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.bytes_served = 0
+    
+    def list_files(self, params):
+        query = params.get('q', '')
+        items = [file for file in self.files.values()]
+        
+        names = [name.replace("\\'", "'").replace('\\\\', '\\')
+                 for name in re.findall(r"name = '((?:[^'\\]|\\.)*)'", query)]
+        if names:
+            items = [file for file in items if file['name'] in names]
+        parents = re.findall(r"'([^']+)' in parents", query)
+        if parents:
+            items = [file for file in items if set(file['parents']) & set(parents)]
+        for operator, mime_type in re.findall(r"mimeType (!?=) '([^']+)'", query):
+            items = [file for file in items if (file['mimeType'] == mime_type) == (operator == '=')]
+        if 'trashed = false' in query:
+            items = [file for file in items if not file['trashed']]
+        
+        page_size = min(int(params.get('pageSize', 100)), MAX_PAGE_SIZE)
+        start = int(params.get('pageToken') or 0)
+        body = {'files': items[start:start + page_size]}
+        if start + page_size < len(items):
+            body['nextPageToken'] = str(start + page_size)
+        return body
+
+def make_handler(drive):
+    class MockDriveHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def log_message(self, *args):
+            pass
+        
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            self.send(*self.route(url.path, params, self.headers))
+        
+        def do_POST(self):
+            url = urlparse(self.path)
+            data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if url.path == '/_stats':
+                self.send(200, drive.stats())
+            elif url.path == '/_reset':
+                drive.reset()
+                self.send(200, {})
+            elif url.path.startswith('/batch'):
+                self.send(*self.route_batch(data))
+            else:
+                self.send(404, {'error': {'code': 404, 'message': 'Not found'}})
+        
+        def send(self, status, body, content_type='application/json', headers=None):
+            if isinstance(body, dict):
+                body = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def route(self, path, params, headers):
+            if drive.latency:
+                time.sleep(drive.latency)
+            if drive.error_rate and random.random() < drive.error_rate:
+                drive.count('429')
+                return 429, {'error': {'code': 429, 'message': 'Rate Limit Exceeded',
+                                       'errors': [{'reason': 'rateLimitExceeded'}]}}
+            
+            if path == '/drive/v3/files':
+                drive.count('files.list')
+                return 200, drive.list_files(params)
+            if path == '/drive/v3/changes/startPageToken':
+                drive.count('changes.getStartPageToken')
+                return 200, {'startPageToken': '1'}
+            if path == '/drive/v3/changes':
+                drive.count('changes.list')
+                return 200, {'changes': [], 'newStartPageToken': '1'}
+            
+            match = re.match(r'^/drive/v3/files/([^/]+)(/export)?$', path)
+            if not match:
+                return 404, {'error': {'code': 404, 'message': 'Not found'}}
+            file_id = ROOT_FOLDER_ID if match.group(1) == 'root' else match.group(1)
+            if file_id == ROOT_FOLDER_ID:
+                drive.count('files.get')
+                return 200, {'id': ROOT_FOLDER_ID, 'name': 'My Drive', 'mimeType': FOLDER_MIME_TYPE}
+            file = drive.files.get(file_id)
+            if not file:
+                return 404, {'error': {'code': 404, 'message': f'File not found: {file_id}'}}
+            
+            if match.group(2):
+                content = ('Exported ' + file['name'] + '\n').encode() * 100
+                drive.count('files.export', len(content))
+                return 200, content, params.get('mimeType', 'application/octet-stream')
+            if params.get('alt') != 'media':
+                drive.count('files.get')
+                return 200, file
+            return self.route_media(file, headers)
+        
+        def route_media(self, file, headers):
+            size = int(file['size'])
+            byte_range = headers.get('Range')
+            if not byte_range:
+                content = drive.read_content(file['id'], 0, size)
+                drive.count('files.get_media', len(content))
+                return 200, content, 'application/octet-stream'
+            
+            first, last = byte_range.split('=')[1].split('-')
+            first = int(first)
+            last = min(int(last) if last else size - 1, size - 1)
+            if first >= size and size:
+                drive.count('files.get_media')
+                return 416, b'', 'application/octet-stream', {'Content-Range': f'bytes */{size}'}
+            content = drive.read_content(file['id'], first, last + 1)
+            drive.count('files.get_media', len(content))
+            return 206, content, 'application/octet-stream', {'Content-Range': f'bytes {first}-{max(first, last)}/{size}'}
+        
+        def route_batch(self, data):
+            drive.count('batch')
+            boundary = self.headers['Content-Type'].split('boundary=')[1].strip('"')
+            response_boundary = 'batch_response'
+            parts = []
+            for part in data.split(b'--' + boundary.encode()):
+                request_line = re.search(rb'GET (\S+) HTTP', part)
+                if not request_line:
+                    continue
+                content_id = re.search(rb'Content-ID: <([^>]*)>', part)
+                url = urlparse(request_line.group(1).decode())
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                status, body = self.route(url.path, params, {})[:2]
+                body = json.dumps(body).encode()
+                parts.append(
+                    f'--{response_boundary}\r\nContent-Type: application/http\r\n'
+                    f'Content-ID: <response-{content_id.group(1).decode() if content_id else ""}>\r\n\r\n'
+                    f'HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n'
+                    f'Content-Length: {len(body)}\r\n\r\n'.encode() + body + b'\r\n'
+                )
+            body = b''.join(parts) + f'--{response_boundary}--\r\n'.encode()
+            return 200, body, f'multipart/mixed; boundary={response_boundary}'
+    
+    return MockDriveHandler
+
+def serve(drive, port=0):
+    """Serve drive on a background thread. Returns the server; its port is server.server_port."""
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(drive))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def point_client_at(port):
+    """Make googleapiclient build Drive services that talk to the mock on this port."""
+    import googleapiclient.discovery
+    from googleapiclient.http import BatchHttpRequest
+    
+    real_build = googleapiclient.discovery.build
+    
+    def build(service_name, version, credentials=None, **kwargs):
+        service = real_build(service_name, version, credentials=credentials, static_discovery=True,
+                             client_options={'api_endpoint': f'http://127.0.0.1:{port}/drive/v3/'})
+        service._set_dynamic_attr('new_batch_http_request', lambda callback=None: BatchHttpRequest(
+            callback=callback, batch_uri=f'http://127.0.0.1:{port}/batch/drive/v3'))
+        return service
+    
+    googleapiclient.discovery.build = build
@@ -0,0 +1,3037 @@
+"""Google Drive backup engine, usable as a library, from the command line or behind the GUI.
+
+The Google client libraries are imported where they are first needed so
+the command line starts quickly, and nothing here imports Tk, so backups
+can run from cron on hosts without a display.
+"""
+import argparse
+import os
+import re
+import random
+import csv
+import hashlib
+import importlib.util
+import json
+import logging
+import queue
+import shutil
+import sqlite3
+import sys
+import tarfile
+import threading
+import time
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from datetime import datetime
+from io import BytesIO
+from logging.handlers import RotatingFileHandler
+
+# Google Workspace types we can export: source MIME type -> (export MIME type, file extension)
+GOOGLE_EXPORT_FORMATS = {
+    'application/vnd.google-apps.document': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx'),
+    'application/vnd.google-apps.spreadsheet': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'application/vnd.google-apps.presentation': ('application/vnd.openxmlformats-officedocument.presentationml.presentation', 'pptx'),
+    'application/vnd.google-apps.drawing': ('image/png', 'png'),
+}
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Further formats each Workspace type can also be exported to: source MIME type -> {file extension: export MIME type}
+EXTRA_EXPORT_FORMATS = {
+    'application/vnd.google-apps.document': {
+        'pdf': 'application/pdf',
+        'odt': 'application/vnd.oasis.opendocument.text',
+        'rtf': 'application/rtf',
+        'txt': 'text/plain',
+        'epub': 'application/epub+zip',
+    },
+    'application/vnd.google-apps.spreadsheet': {
+        'pdf': 'application/pdf',
+        'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+        'csv': 'text/csv',
+    },
+    'application/vnd.google-apps.presentation': {
+        'pdf': 'application/pdf',
+        'odp': 'application/vnd.oasis.opendocument.presentation',
+    },
+    'application/vnd.google-apps.drawing': {
+        'pdf': 'application/pdf',
+        'svg': 'image/svg+xml',
+        'jpg': 'image/jpeg',
+    },
+}
+
+# Metadata requested for every listed file
+FILE_FIELDS = "id, name, mimeType, parents, modifiedTime, md5Checksum, size, ownedByMe, trashed"
+
+# Orders a backup can process files in: name -> files.list orderBy
+BACKUP_ORDERS = {
+    'smallest': 'quotaBytesUsed',
+    'largest': 'quotaBytesUsed desc',
+    'recent': 'modifiedTime desc',
+    'oldest': 'modifiedTime',
+    'name': 'name',
+}
+
+# Incremental backup manifest, kept in each user's backup folder
+MANIFEST_FILE_NAME = "manifest.sqlite"
+
+# Checkpoint journals for interrupted runs, kept in each user's backup folder until the run finishes
+BACKUP_CHECKPOINT_FILE_NAME = "checkpoint_backup.sqlite"
+SPECIFIC_CHECKPOINT_FILE_NAME = "checkpoint_specific.sqlite"
+
+# Checkpoints older than this are dropped rather than resumed, so a file that keeps failing
+# cannot pin every later run to an old snapshot folder
+CHECKPOINT_MAX_AGE_HOURS = 24
+
+# Checksum results of every download, kept in the folder the files were saved to
+VERIFICATION_REPORT_FILE_NAME = "verification_report.csv"
+VERIFICATION_REPORT_FIELDS = ['path', 'file_id', 'size', 'expected_md5', 'actual_md5', 'status']
+
+# Content-addressed store of file contents shared by every user and snapshot, inside the backup directory
+BLOB_STORE_DIR_NAME = ".store"
+
+# Shared drives are backed up below this folder of the backup directory, one tree per drive
+SHARED_DRIVES_DIR_NAME = "shared_drives"
+
+# Archive formats a backup can be written to instead of a folder tree; tar.zst needs the zstandard package
+ARCHIVE_FORMATS = ('zip', 'tar.zst')
+
+# Sidecar index of archive runs: one JSON line per entry with its volume, byte range and checksums
+ARCHIVE_INDEX_FILE_NAME = "archive_index.jsonl"
+
+# Archive volumes are closed and a new one started once they reach this size
+DEFAULT_VOLUME_SIZE_MB = 4096
+
+# zstd level for tar.zst archives; 3 compresses well at download speed
+ZSTD_LEVEL = 3
+
+# Block size used when hashing files already on disk
+HASH_BLOCK_SIZE = 1048576
+
+# Files handed to each verify-only worker process at a time
+VERIFY_BATCH_SIZE = 16
+
+# Exports made for a user, reused while the document's modifiedTime is unchanged
+EXPORT_CACHE_FILE_NAME = "export_cache.sqlite"
+
+# Folder metadata cache shared by full backups and specific-file downloads of a user
+FOLDER_CACHE_FILE_NAME = "folder_cache.sqlite"
+FOLDER_CACHE_TTL_DAYS = 7
+FOLDER_CACHE_MAX_ENTRIES = 200000
+
+# Drive rejects overly long search queries; OR-combined name lookups stay under this length
+MAX_QUERY_LENGTH = 2000
+
+# Maximum number of calls Drive accepts in one batch request
+MAX_BATCH_SIZE = 100
+
+# Number of files downloaded in parallel unless configured otherwise
+DEFAULT_CONCURRENCY = 8
+
+# Files at least this large are downloaded over several connections at once, one byte range each
+DEFAULT_RANGE_THRESHOLD_MB = 256
+
+# Parallel connections used for each such file
+DEFAULT_RANGE_CONNECTIONS = 4
+
+# Workspace exports run on a pool of their own so slow server-side conversions cannot hold up downloads
+DEFAULT_EXPORT_CONCURRENCY = 2
+
+# Jobs that may wait for a free worker in each pool before the listing is paused
+MAX_QUEUED_JOBS = 1000
+
+# Shared API rate limiter: starting, lowest and highest requests per second, and how it speeds back up
+DEFAULT_API_RATE = 20
+MIN_API_RATE = 1
+MAX_API_RATE = 200
+API_RATE_INCREASE_AFTER = 20
+API_RATE_INCREASE_FACTOR = 1.25
+API_RATE_DECREASE_COOLDOWN_SECONDS = 2
+
+# 403 reasons Drive uses for rate limiting (429 is always a rate limit)
+RATE_LIMIT_REASONS = ('userRateLimitExceeded', 'rateLimitExceeded', 'sharingRateLimitExceeded')
+
+# Exponential backoff for rate-limited or failed API calls
+MAX_API_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1
+MAX_BACKOFF_SECONDS = 64
+
+# Prometheus textfile-collector file written to the metrics directory after every run
+PROMETHEUS_FILE_NAME = "drivebackup.prom"
+
+# Durations kept per operation for percentiles; longer runs keep a random sample of this size
+METRICS_SAMPLE_SIZE = 10000
+
+# Files that still fail after the main pass are queued and retried this many times
+RETRY_ROUNDS = 3
+RETRY_DELAY_SECONDS = 10
+
+# Bulk backups: users backed up at the same time, and downloads in flight across all of them
+DEFAULT_PARALLEL_USERS = 4
+DEFAULT_GLOBAL_LIMIT = 16
+
+# Size of each download request; a download never holds more than one chunk in memory
+DEFAULT_CHUNK_SIZE_MB = 10
+
+# File listing pages fetched ahead of the downloads while they run
+LISTING_PREFETCH_PAGES = 2
+
+# Full log kept in the backup directory, rotated so it never grows without bound
+LOG_FILE_NAME = "drivebackup.log"
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+logger = logging.getLogger("drivebackup")
+logger.setLevel(logging.INFO)
+log_file_handler = None
+
+def escape_query_value(value):
+    """Escape a string for use inside a quoted Drive search query value."""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
+
+def join_query_clauses(clauses, operator="or"):
+    """Join query clauses into as few queries as MAX_QUERY_LENGTH allows. Returns the list of queries."""
+    queries = []
+    joined = []
+    for clause in clauses:
+        if joined and len(f" {operator} ".join(joined + [clause])) > MAX_QUERY_LENGTH:
+            queries.append(f" {operator} ".join(joined))
+            joined = []
+        joined.append(clause)
+    if joined:
+        queries.append(f" {operator} ".join(joined))
+    return queries
+
+def get_error_reason(error):
+    """Return the reason Drive gave for an HttpError, e.g. 'userRateLimitExceeded'."""
+    try:
+        return json.loads(error.content)['error']['errors'][0]['reason']
+    except (ValueError, KeyError, IndexError, TypeError):
+        return ''
+
+def is_rate_limit_error(error):
+    """Check whether an error is Drive telling us to slow down."""
+    from googleapiclient.errors import HttpError
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and get_error_reason(error) in RATE_LIMIT_REASONS
+
+def get_api_method(call):
+    """Name the Drive method behind a call passed to call_api, e.g. "drive.files.list"."""
+    request = getattr(call, '__self__', None)
+    # MediaIoBaseDownload.next_chunk fetches part of the request it wraps
+    request = getattr(request, '_request', request)
+    return getattr(request, 'methodId', None) or ("batch" if hasattr(request, '_requests') else "other")
+
+def is_retryable_error(error):
+    """Check whether an API error is worth retrying after a pause."""
+    from googleapiclient.errors import HttpError
+    return is_rate_limit_error(error) or (isinstance(error, HttpError) and error.resp.status in (500, 502, 503, 504))
+
+def hash_file(path):
+    """Return (path, md5 hex digest), or (path, None) if the file cannot be read."""
+    md5 = hashlib.md5()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                md5.update(block)
+    except OSError:
+        return path, None
+    return path, md5.hexdigest()
+
+def hash_archive_volume(path):
+    """Return (path, {entry name: md5 hex digest}) for an archive volume, or (path, None) if it cannot be read."""
+    digests = {}
+    try:
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as zip_file:
+                for info in zip_file.infolist():
+                    if info.is_dir():
+                        continue
+                    md5 = hashlib.md5()
+                    with zip_file.open(info) as f:
+                        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                            md5.update(block)
+                    digests[info.filename] = md5.hexdigest()
+        else:
+            import zstandard
+            
+            with open(path, 'rb') as f, zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True) as reader:
+                with tarfile.open(fileobj=reader, mode='r|') as tar:
+                    for member in tar:
+                        if not member.isfile():
+                            continue
+                        md5 = hashlib.md5()
+                        data = tar.extractfile(member)
+                        for block in iter(lambda: data.read(HASH_BLOCK_SIZE), b""):
+                            md5.update(block)
+                        digests[member.name] = md5.hexdigest()
+    except Exception as e:
+        logger.warning(f"Could not read archive volume {path}: {str(e)}")
+        return path, None
+    return path, digests
+
+def open_log_file(path):
+    """Send every engine log line to a rotating file at path, replacing any previous log file."""
+    global log_file_handler
+    path = os.path.abspath(path)
+    if log_file_handler and log_file_handler.baseFilename == path:
+        return
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    handler = RotatingFileHandler(path, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT,
+                                  encoding='utf-8')
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    if log_file_handler:
+        logger.removeHandler(log_file_handler)
+        log_file_handler.close()
+    log_file_handler = handler
+
+def get_shared_drive_dir_name(drive):
+    """Folder name for a shared drive's backups: its name made safe for paths, plus its ID.
+    
+    The ID keeps drives that share a name apart.
+    """
+    name = re.sub(r'[\\/:*?"<>|]', '_', drive['name']).strip() or "drive"
+    return f"{name}_{drive['id']}"
+
+def parse_user_list(value):
+    """Read user emails from a CSV file path or a comma/whitespace separated list."""
+    value = value.strip()
+    if os.path.isfile(value):
+        user_emails = []
+        with open(value, newline='') as f:
+            for row in csv.reader(f):
+                # Take the first cell that looks like an email, which also skips header rows
+                email = next((cell.strip() for cell in row if '@' in cell), None)
+                if email:
+                    user_emails.append(email)
+    else:
+        user_emails = [email for email in re.split(r'[,\s]+', value) if email]
+    
+    # Drop duplicates but keep the order
+    return list(dict.fromkeys(user_emails))
+
+class ChecksumMismatchError(Exception):
+    """Raised when downloaded bytes do not match the md5Checksum Drive reported."""
+    
+    def __init__(self, expected_md5, actual_md5):
+        super().__init__(f"checksum mismatch (expected {expected_md5}, got {actual_md5})")
+        self.actual_md5 = actual_md5
+
+class HashingWriter:
+    """File wrapper that feeds everything written through it into an md5 hash.
+    
+    With metrics, every write is timed as a disk_write and counted in bytes_downloaded.
+    """
+    
+    def __init__(self, f, md5, metrics=None):
+        self.f = f
+        self.md5 = md5
+        self.metrics = metrics
+    
+    def write(self, data):
+        self.md5.update(data)
+        if not self.metrics:
+            return self.f.write(data)
+        with self.metrics.span("disk_write"):
+            written = self.f.write(data)
+        self.metrics.count("bytes_downloaded", len(data))
+        return written
+
+class VerificationReport:
+    """CSV log of checksum results, one row per verified download attempt.
+    
+    Paths are stored relative to the report's folder so the backup can be
+    audited later, after being moved. Rows are appended, so a resumed run
+    keeps the results of the interrupted one. Safe to use from workers.
+    """
+    
+    def __init__(self, path):
+        self.base_dir = os.path.dirname(path)
+        self.lock = threading.Lock()
+        self.passed = 0
+        self.failed = 0
+        new_file = not os.path.exists(path)
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=VERIFICATION_REPORT_FIELDS)
+        if new_file:
+            self.writer.writeheader()
+    
+    def record(self, local_path, file, actual_md5, status):
+        with self.lock:
+            if status == 'passed':
+                self.passed += 1
+            elif status == 'failed':
+                self.failed += 1
+            self.writer.writerow({
+                'path': os.path.relpath(local_path, self.base_dir),
+                'file_id': file['id'],
+                'size': file.get('size', ''),
+                'expected_md5': file.get('md5Checksum', ''),
+                'actual_md5': actual_md5 or '',
+                'status': status,
+            })
+            self.file.flush()
+    
+    def close(self):
+        self.file.close()
+
+class BlobStore:
+    """Content-addressed store of file contents shared by every user and snapshot.
+    
+    Each distinct content is kept once, at <root>/<first two hex digits>/<md5>,
+    and snapshot files are hardlinks to it, so a file that many users share
+    is only downloaded and stored once. Safe to use from workers.
+    """
+    
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.bytes_saved = 0
+    
+    def blob_path(self, md5):
+        return os.path.join(self.root, md5[:2], md5)
+    
+    def link_to(self, md5, target_path):
+        """Hardlink the stored content for md5 to target_path. Returns False if it is not stored."""
+        blob_path = self.blob_path(md5)
+        if not os.path.exists(blob_path):
+            return False
+        self.link(blob_path, target_path)
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += os.path.getsize(blob_path)
+        return True
+    
+    def add(self, path, md5):
+        """Store a finished file, or replace it with a link to the stored copy if there is one already."""
+        blob_path = self.blob_path(md5)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        try:
+            os.link(path, blob_path)
+        except FileExistsError:
+            self.link(blob_path, path)
+    
+    def link(self, source_path, target_path):
+        if os.path.exists(target_path) and os.path.samefile(source_path, target_path):
+            return
+        # Link under a temporary name first so target_path is never left half replaced
+        temp_path = f"{target_path}.link"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        os.link(source_path, temp_path)
+        os.replace(temp_path, target_path)
+
+class ZipVolume:
+    """One zip volume of an archive run, written by a single worker thread."""
+    
+    def __init__(self, path):
+        self.path = path
+        self.zip_file = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+    
+    def size(self):
+        return self.zip_file.fp.tell()
+    
+    def has_entry(self, name):
+        return name in self.zip_file.NameToInfo
+    
+    @contextmanager
+    def open_entry(self, name, size):
+        """Stream one entry; yields a writable and sets last_entry to (offset, length, size) once it is complete."""
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED
+        # Without a known size the entry may still outgrow 4 GB
+        force_zip64 = size is None or size >= zipfile.ZIP64_LIMIT
+        with self.zip_file.open(info, 'w', force_zip64=force_zip64) as entry:
+            yield entry
+        self.last_entry = (info.header_offset, self.size() - info.header_offset, info.file_size)
+    
+    def add_directory(self, name):
+        self.zip_file.writestr(name + '/', b'')
+    
+    def close(self):
+        self.zip_file.close()
+
+class TarZstVolume:
+    """One tar.zst volume of an archive run, written by a single worker thread.
+    
+    Every entry is a zstd frame of its own, so an entry that fails halfway
+    is cut off again and any entry can be read on its own by decompressing
+    its byte range. The frames together decompress to one plain tar file.
+    """
+    
+    def __init__(self, path):
+        import zstandard
+        
+        self.path = path
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        self.file = open(path, 'wb')
+    
+    def size(self):
+        return self.file.tell()
+    
+    def has_entry(self, name):
+        return False
+    
+    @contextmanager
+    def open_entry(self, name, size):
+        """Stream one entry; yields a writable and sets last_entry to (offset, length, size) once it is complete."""
+        offset = self.file.tell()
+        try:
+            if size is None:
+                # tar needs the size up front; exports are capped at 10 MB by Drive, so keep them in memory
+                buffer = BytesIO()
+                yield buffer
+                data = buffer.getvalue()
+                entry = TarZstEntry(self.file, self.compressor.compressobj(), name, len(data))
+                entry.write(data)
+            else:
+                entry = TarZstEntry(self.file, self.compressor.compressobj(), name, size)
+                yield entry
+            entry.finish()
+        except BaseException:
+            # Drop the partial entry so the volume stays a valid archive
+            self.file.seek(offset)
+            self.file.truncate()
+            raise
+        self.last_entry = (offset, self.file.tell() - offset, entry.size)
+    
+    def add_directory(self, name):
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+        info.mtime = time.time()
+        self.file.write(self.compressor.compress(info.tobuf(format=tarfile.PAX_FORMAT)))
+    
+    def close(self):
+        # End-of-archive marker: two empty tar blocks
+        self.file.write(self.compressor.compress(b"\0" * tarfile.BLOCKSIZE * 2))
+        self.file.close()
+
+class TarZstEntry:
+    """Writable for one tar member of a TarZstVolume, compressed as its own zstd frame."""
+    
+    def __init__(self, file, compressobj, name, size):
+        self.file = file
+        self.compressobj = compressobj
+        self.size = size
+        self.written = 0
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mode = 0o644
+        info.mtime = time.time()
+        self.file.write(self.compressobj.compress(info.tobuf(format=tarfile.PAX_FORMAT)))
+    
+    def write(self, data):
+        self.written += len(data)
+        if self.written > self.size:
+            raise OSError(f"entry is larger than the {self.size} bytes Drive reported")
+        self.file.write(self.compressobj.compress(data))
+        return len(data)
+    
+    def finish(self):
+        if self.written != self.size:
+            raise OSError(f"entry has {self.written} bytes, Drive reported {self.size}")
+        padding = -self.size % tarfile.BLOCKSIZE
+        self.file.write(self.compressobj.compress(b"\0" * padding) + self.compressobj.flush())
+
+class ArchiveSet:
+    """Writes a backup snapshot into archive volumes instead of a folder tree.
+    
+    Each worker thread writes to volumes of its own, so entries are
+    streamed from Drive straight into the archive without locking or local
+    staging, and moves on to a new volume once the current one reaches
+    volume_size bytes. Every entry is listed in a JSONL index next to the
+    volumes with its byte range, so it can be found without scanning them.
+    Also stands in for the VerificationReport of the run.
+    """
+    
+    def __init__(self, base_dir, archive_format, volume_size):
+        if archive_format == 'tar.zst' and importlib.util.find_spec('zstandard') is None:
+            raise RuntimeError("tar.zst archives need the zstandard package (pip install zstandard)")
+        self.base_dir = base_dir
+        self.archive_format = archive_format
+        self.volume_size = volume_size
+        self.run_name = f"backup-{datetime.now().strftime('%H%M%S')}"
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.volumes = []
+        self.writer_count = 0
+        self.passed = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.index = open(os.path.join(base_dir, ARCHIVE_INDEX_FILE_NAME), 'a')
+    
+    def get_volume(self, name):
+        """Return the calling thread's current volume, starting a new one when it is full."""
+        volume = getattr(self.local, 'volume', None)
+        if volume and (volume.size() >= self.volume_size or volume.has_entry(name)):
+            # A zip volume cannot hold two entries of the same name, e.g. after a failed attempt
+            volume = None
+        if volume is None:
+            with self.lock:
+                if not hasattr(self.local, 'writer'):
+                    self.writer_count += 1
+                    self.local.writer = self.writer_count
+                    self.local.volume_number = 0
+                self.local.volume_number += 1
+                file_name = f"{self.run_name}-{self.local.writer:02d}-{self.local.volume_number:03d}.{self.archive_format}"
+                volume_class = ZipVolume if self.archive_format == 'zip' else TarZstVolume
+                volume = volume_class(os.path.join(self.base_dir, file_name))
+                self.volumes.append(volume)
+            self.local.volume = volume
+        return volume
+    
+    def get_entry_name(self, local_path):
+        return os.path.relpath(local_path, self.base_dir).replace(os.sep, '/')
+    
+    @contextmanager
+    def open_entry(self, local_path, size=None):
+        """Context manager yielding a writable for the file that would be saved at local_path."""
+        name = self.get_entry_name(local_path)
+        volume = self.get_volume(name)
+        self.local.last_entry = None
+        with volume.open_entry(name, size) as entry:
+            yield entry
+        self.local.last_entry = (name, volume) + volume.last_entry
+    
+    def add_directory(self, local_path):
+        self.get_volume("").add_directory(self.get_entry_name(local_path))
+    
+    def record(self, local_path, file, actual_md5, status):
+        """Index the entry just written for local_path with its checksum result."""
+        name = self.get_entry_name(local_path)
+        row = {'path': name, 'file_id': file['id'], 'size': file.get('size', ''),
+               'expected_md5': file.get('md5Checksum', ''), 'actual_md5': actual_md5 or '', 'status': status}
+        last_entry = getattr(self.local, 'last_entry', None)
+        if last_entry and last_entry[0] == name:
+            _, volume, offset, length, size = last_entry
+            row.update(volume=os.path.basename(volume.path), offset=offset, length=length, size=size)
+        
+        with self.lock:
+            if status == 'passed':
+                self.passed += 1
+            elif status == 'failed':
+                self.failed += 1
+            if 'volume' in row:
+                self.bytes_written += row['size']
+            self.index.write(json.dumps(row) + "\n")
+            self.index.flush()
+    
+    def close(self):
+        with self.lock:
+            for volume in self.volumes:
+                volume.close()
+            self.volumes = []
+            self.index.close()
+
+class BackupMetrics:
+    """Timing spans, counters and gauges for one backup run. Safe to use from workers.
+    
+    Every span is also written as a JSON line to jsonl_path, if given.
+    Durations are kept per operation for the p50/p95 summary, as a random
+    sample once an operation has more than METRICS_SAMPLE_SIZE of them.
+    """
+    
+    def __init__(self, jsonl_path=None):
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.durations = {}
+        self.totals = {}
+        self.counts = {}
+        self.counters = {}
+        self.gauges = {}
+        self.jsonl = open(jsonl_path, 'a') if jsonl_path else None
+    
+    @contextmanager
+    def span(self, operation):
+        """Time the body of a with statement as one operation."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(operation, time.perf_counter() - started, ok)
+    
+    def observe(self, operation, seconds, ok=True):
+        with self.lock:
+            count = self.counts.get(operation, 0) + 1
+            self.counts[operation] = count
+            self.totals[operation] = self.totals.get(operation, 0) + seconds
+            sample = self.durations.setdefault(operation, [])
+            if len(sample) < METRICS_SAMPLE_SIZE:
+                sample.append(seconds)
+            else:
+                # Reservoir sampling keeps every duration equally likely to stay
+                index = self.random.randrange(count)
+                if index < METRICS_SAMPLE_SIZE:
+                    sample[index] = seconds
+            if self.jsonl:
+                self.jsonl.write(json.dumps({'time': round(time.time(), 3), 'type': 'span', 'operation': operation,
+                                             'seconds': round(seconds, 6), 'ok': ok}) + "\n")
+    
+    def count(self, name, value=1, **labels):
+        """Add to a counter, optionally broken down by labels such as method="drive.files.list"."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+    
+    def gauge(self, name, value):
+        """Record the current value of something like a queue depth, keeping the highest seen."""
+        with self.lock:
+            last, highest = self.gauges.get(name, (0, 0))
+            self.gauges[name] = (value, max(highest, value))
+    
+    def get_percentile(self, operation, fraction):
+        sample = sorted(self.durations[operation])
+        return sample[min(len(sample) - 1, int(fraction * len(sample)))]
+    
+    def get_summary_lines(self):
+        """Return the end-of-run table of operations, counters and gauges as lines of text."""
+        with self.lock:
+            lines = [f"{'Operation':<32}{'Count':>8}{'Total s':>10}{'p50 ms':>10}{'p95 ms':>10}{'Max ms':>10}"]
+            for operation in sorted(self.counts, key=lambda name: -self.totals[name]):
+                lines.append(f"{operation:<32}{self.counts[operation]:>8}{self.totals[operation]:>10.1f}"
+                             f"{self.get_percentile(operation, 0.5) * 1000:>10.1f}"
+                             f"{self.get_percentile(operation, 0.95) * 1000:>10.1f}"
+                             f"{max(self.durations[operation]) * 1000:>10.1f}")
+            for (name, labels), value in sorted(self.counters.items()):
+                label_text = ", ".join(f"{key}={label}" for key, label in labels)
+                lines.append(f"{name}{f' [{label_text}]' if labels else ''}: {value}")
+            for name, (last, highest) in sorted(self.gauges.items()):
+                lines.append(f"{name}: max {highest}")
+            return lines
+    
+    def write_prometheus(self, path):
+        """Write everything in the Prometheus text format, replacing path atomically for the textfile collector."""
+        with self.lock:
+            lines = [
+                "# HELP drivebackup_operation_seconds Time spent per backup operation.",
+                "# TYPE drivebackup_operation_seconds summary",
+            ]
+            for operation in sorted(self.counts):
+                label = f'operation="{operation}"'
+                for fraction in (0.5, 0.95):
+                    lines.append(f'drivebackup_operation_seconds{{{label},quantile="{fraction}"}} '
+                                 f'{self.get_percentile(operation, fraction):.6f}')
+                lines.append(f"drivebackup_operation_seconds_sum{{{label}}} {self.totals[operation]:.6f}")
+                lines.append(f"drivebackup_operation_seconds_count{{{label}}} {self.counts[operation]}")
+            
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE drivebackup_{name}_total counter")
+                for (counter_name, labels), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+                        lines.append(f"drivebackup_{name}_total{f'{{{label_text}}}' if labels else ''} {value}")
+            
+            for name, (last, highest) in sorted(self.gauges.items()):
+                lines.append(f"# TYPE drivebackup_{name} gauge")
+                lines.append(f"drivebackup_{name} {last}")
+                lines.append(f"# TYPE drivebackup_{name}_max gauge")
+                lines.append(f"drivebackup_{name}_max {highest}")
+            
+            lines.append("# TYPE drivebackup_last_run_timestamp_seconds gauge")
+            lines.append(f"drivebackup_last_run_timestamp_seconds {time.time():.0f}")
+        
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+    
+    def close(self):
+        """Append the final counter and gauge values to the JSON lines file and close it."""
+        with self.lock:
+            if self.jsonl:
+                now = round(time.time(), 3)
+                for (name, labels), value in sorted(self.counters.items()):
+                    self.jsonl.write(json.dumps({'time': now, 'type': 'counter', 'name': name, 'labels': dict(labels),
+                                                 'value': value}) + "\n")
+                for name, (last, highest) in sorted(self.gauges.items()):
+                    self.jsonl.write(json.dumps({'time': now, 'type': 'gauge', 'name': name, 'value': last,
+                                                 'max': highest}) + "\n")
+                self.jsonl.close()
+                self.jsonl = None
+
+class RateLimiter:
+    """Token bucket shared by all workers whose rate adapts to Drive's rate-limit responses.
+    
+    A rate-limit response halves the rate (at most once per cooldown, since
+    workers tend to be limited together) and every run of successful calls
+    raises it a step again, so the request rate settles just under the quota.
+    """
+    
+    def __init__(self, rate=DEFAULT_API_RATE, min_rate=MIN_API_RATE, max_rate=MAX_API_RATE):
+        self.lock = threading.Lock()
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = self.rate
+        self.updated = time.monotonic()
+        self.successes = 0
+        self.last_decrease = 0
+    
+    def acquire(self):
+        """Block until a request may be sent."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                # Let the bucket hold at least one token so slow rates still make progress
+                self.tokens = min(max(self.rate, 1), self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+    
+    def on_success(self):
+        with self.lock:
+            self.successes += 1
+            if self.successes >= API_RATE_INCREASE_AFTER:
+                self.rate = min(self.max_rate, self.rate * API_RATE_INCREASE_FACTOR)
+                self.successes = 0
+    
+    def on_rate_limited(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease >= API_RATE_DECREASE_COOLDOWN_SECONDS:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.last_decrease = now
+            self.tokens = 0
+            self.successes = 0
+
+class BackupManifest:
+    """SQLite record of every file the last backup of a user wrote to disk.
+    
+    Local paths are stored relative to the user's backup folder so the
+    next incremental run can link unchanged files from the previous
+    snapshot. The connection must only be used from the thread that
+    opened it.
+    """
+    
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS files (id TEXT PRIMARY KEY, name TEXT, mime_type TEXT, parents TEXT, "
+            "modified_time TEXT, md5_checksum TEXT, size INTEGER, local_path TEXT)"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+    
+    def get_state(self, key):
+        row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_state(self, key, value):
+        self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+    
+    def get_files(self):
+        """Return the recorded files as Drive-style dicts keyed by file ID."""
+        files = {}
+        for row in self.connection.execute(
+                "SELECT id, name, mime_type, parents, modified_time, md5_checksum, size, local_path FROM files"):
+            file_id, name, mime_type, parents, modified_time, md5_checksum, size, local_path = row
+            files[file_id] = {
+                'id': file_id,
+                'name': name,
+                'mimeType': mime_type,
+                'parents': json.loads(parents) if parents else [],
+                'modifiedTime': modified_time,
+                'md5Checksum': md5_checksum,
+                'size': size,
+                'local_path': local_path,
+            }
+        return files
+    
+    def record_file(self, file, local_path):
+        """Store a file's metadata; local_path is None if it was not backed up."""
+        self.connection.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (file['id'], file['name'], file['mimeType'], json.dumps(file.get('parents', [])),
+             file.get('modifiedTime'), file.get('md5Checksum'), file.get('size'), local_path)
+        )
+    
+    def remove_file(self, file_id):
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+    
+    def commit(self):
+        self.connection.commit()
+    
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+class CheckpointJournal:
+    """Persistent record of a backup run in progress, used to resume it after a crash.
+    
+    Tracks the run's target folder, the IDs and versions of files already
+    finished and the byte offset reached by partially downloaded files.
+    Safe to use from several worker threads.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS completed (id TEXT PRIMARY KEY, local_path TEXT, version TEXT)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS partial (path TEXT PRIMARY KEY, version TEXT, offset INTEGER)"
+        )
+        # Journals from before versions were recorded; their rows never match and are fetched again
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(completed)")]
+        if 'version' not in columns:
+            self.connection.execute("ALTER TABLE completed ADD COLUMN version TEXT")
+        if not self.get_state('created_at'):
+            self.set_state('created_at', str(time.time()))
+    
+    def is_expired(self, max_age_hours=CHECKPOINT_MAX_AGE_HOURS):
+        """Check whether the run this journal belongs to started too long ago to resume."""
+        return time.time() - float(self.get_state('created_at')) > max_age_hours * 3600
+    
+    def get_state(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def set_state(self, key, value):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+    
+    def get_version(self, file):
+        return file.get('md5Checksum') or file.get('modifiedTime')
+    
+    def get_completed(self, file):
+        """Return the local path of a file finished by an earlier attempt, if that version is still on disk.
+        
+        A file changed on Drive since then is not returned, so it is fetched again.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT local_path, version FROM completed WHERE id = ?",
+                                          (file['id'],)).fetchone()
+        if row and row[1] == self.get_version(file) and os.path.exists(row[0]):
+            return row[0]
+        return None
+    
+    def mark_completed(self, file, local_path):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO completed (id, local_path, version) VALUES (?, ?, ?)",
+                                    (file['id'], local_path, self.get_version(file)))
+    
+    def get_partial_offset(self, path, version):
+        """Return how many bytes of path are known good for this version of the file."""
+        with self.lock:
+            row = self.connection.execute("SELECT version, offset FROM partial WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == version:
+            return row[1]
+        return 0
+    
+    def set_partial_offset(self, path, version, offset):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO partial (path, version, offset) VALUES (?, ?, ?)",
+                                    (path, version, offset))
+    
+    def clear_partial(self, path):
+        with self.lock:
+            self.connection.execute("DELETE FROM partial WHERE path = ?", (path,))
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+    
+    def discard(self):
+        """Delete the journal and any leftover partial downloads once its run has finished."""
+        with self.lock:
+            partial_paths = [row[0] for row in self.connection.execute("SELECT path FROM partial")]
+        for path in partial_paths:
+            if os.path.exists(path):
+                os.remove(path)
+        
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
+
+class ExportCache:
+    """SQLite record of the Workspace exports made for a user, keyed by file ID and export format.
+    
+    An export of a document whose modifiedTime has not changed since can
+    be linked from the earlier snapshot instead of having Drive convert it
+    again. Paths are stored relative to the user's backup folder. Safe to
+    use from several worker threads.
+    """
+    
+    def __init__(self, path):
+        self.base_dir = os.path.dirname(path)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.bytes_saved = 0
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS exports (file_id TEXT, export_mime_type TEXT, modified_time TEXT, "
+            "local_path TEXT, md5 TEXT, PRIMARY KEY (file_id, export_mime_type))"
+        )
+    
+    def get(self, file, export_mime_type):
+        """Return (local path, md5) of an existing export of this version of the file, or None."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT modified_time, local_path, md5 FROM exports WHERE file_id = ? AND export_mime_type = ?",
+                (file['id'], export_mime_type)
+            ).fetchone()
+        if not row or not file.get('modifiedTime') or row[0] != file['modifiedTime']:
+            return None
+        local_path = os.path.join(self.base_dir, row[1])
+        return (local_path, row[2]) if os.path.exists(local_path) else None
+    
+    def record_reuse(self, local_path):
+        """Count an earlier export linked to local_path, so its bytes are not reported as downloaded."""
+        size = os.path.getsize(local_path)
+        with self.lock:
+            self.hits += 1
+            self.bytes_saved += size
+    
+    def record(self, file, export_mime_type, local_path, md5):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO exports (file_id, export_mime_type, modified_time, local_path, md5) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file['id'], export_mime_type, file.get('modifiedTime'), os.path.relpath(local_path, self.base_dir), md5)
+            )
+    
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+class FolderCache:
+    """On-disk cache of folder ID -> name and parents, shared by all runs for a user.
+    
+    Entries older than the TTL are dropped when the cache is opened and the
+    least recently used entries are evicted on save once the cache grows
+    past max_entries. Lookups are served from memory; use from one thread.
+    """
+    
+    def __init__(self, path, ttl_days=FOLDER_CACHE_TTL_DAYS, max_entries=FOLDER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS folders (id TEXT PRIMARY KEY, name TEXT, parents TEXT, "
+            "fetched_at REAL, last_used REAL)"
+        )
+        self.connection.execute("DELETE FROM folders WHERE fetched_at < ?", (time.time() - ttl_days * 86400,))
+        self.connection.commit()
+        
+        self.folders = {}
+        for folder_id, name, parents in self.connection.execute("SELECT id, name, parents FROM folders"):
+            self.folders[folder_id] = {'id': folder_id, 'name': name, 'parents': json.loads(parents)}
+        
+        self.fetched = {}
+        self.used = set()
+    
+    def __len__(self):
+        return len(self.folders)
+    
+    def get(self, folder_id):
+        folder = self.folders.get(folder_id)
+        if folder:
+            self.used.add(folder_id)
+        return folder
+    
+    def update(self, folders):
+        """Add or refresh folders fetched from Drive."""
+        for folder in folders:
+            entry = {'id': folder['id'], 'name': folder['name'], 'parents': folder.get('parents', [])}
+            self.folders[folder['id']] = entry
+            self.fetched[folder['id']] = entry
+    
+    def save(self):
+        """Write new entries and usage times to disk, then evict the least recently used."""
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO folders (id, name, parents, fetched_at, last_used) VALUES (?, ?, ?, ?, ?)",
+            [(folder['id'], folder['name'], json.dumps(folder['parents']), now, now) for folder in self.fetched.values()]
+        )
+        self.connection.executemany(
+            "UPDATE folders SET last_used = ? WHERE id = ?",
+            [(now, folder_id) for folder_id in self.used if folder_id not in self.fetched]
+        )
+        self.connection.execute(
+            "DELETE FROM folders WHERE id NOT IN (SELECT id FROM folders ORDER BY last_used DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+        self.connection.commit()
+        self.fetched = {}
+        self.used = set()
+    
+    def close(self):
+        self.save()
+        self.connection.close()
+
+class PathResolver:
+    """Works out local paths for Drive items while the listing is still streaming in.
+    
+    An item's path is only known once every folder above it has been
+    listed, so items are held back until their parent arrives. Items
+    whose parent never shows up (e.g. shared from outside the Drive) are
+    placed at the top level by finish().
+    """
+    
+    def __init__(self, root_id=None):
+        self.paths = {root_id: ""} if root_id else {}
+        self.waiting = {}
+    
+    def __len__(self):
+        return sum(len(items) for items in self.waiting.values())
+    
+    def add(self, file):
+        """Record a listed item. Returns (file, relative_path) for every item that became resolvable."""
+        parents = file.get('parents') or []
+        if parents and parents[0] not in self.paths:
+            self.waiting.setdefault(parents[0], []).append(file)
+            return []
+        return self.resolve(file, self.paths.get(parents[0], "") if parents else "")
+    
+    def finish(self):
+        """Resolve everything still waiting for a parent that was never listed."""
+        ready = []
+        # Start from parents that were never listed; resolving those releases everything below them
+        listed = {file['id'] for items in self.waiting.values() for file in items}
+        for parent_id in [parent_id for parent_id in self.waiting if parent_id not in listed]:
+            for file in self.waiting.pop(parent_id):
+                ready.extend(self.resolve(file, ""))
+        
+        # Anything left only waits on itself through a cycle of parents
+        for parent_id in list(self.waiting):
+            for file in self.waiting.pop(parent_id, []):
+                ready.extend(self.resolve(file, ""))
+        return ready
+    
+    def resolve(self, file, parent_path):
+        ready = []
+        stack = [(file, parent_path)]
+        while stack:
+            file, parent_path = stack.pop()
+            path = os.path.join(parent_path, file['name']) if parent_path else file['name']
+            self.paths[file['id']] = path
+            ready.append((file, path))
+            stack.extend((child, path) for child in self.waiting.pop(file['id'], []))
+        return ready
+
+class BackupSelection:
+    """Which files a full backup takes, and in which order.
+    
+    Everything Drive can filter on (owner, trash, modification time, MIME
+    type and parent folder) becomes part of the files.list query, so
+    unwanted files are never listed. Drive cannot filter on size, so
+    max_size_mb is checked here. Folders are always listed, whatever the
+    file filters say, since paths are built from them.
+    """
+    
+    def __init__(self, owned_only=False, skip_trashed=False, modified_after=None, mime_types=(), max_size_mb=None,
+                 folder_id=None, order=None):
+        self.owned_only = owned_only
+        self.skip_trashed = skip_trashed
+        # A bare date means midnight UTC
+        if modified_after and len(modified_after) == 10:
+            modified_after = f"{modified_after}T00:00:00"
+        self.modified_after = modified_after or None
+        self.mime_types = [mime_type.strip() for mime_type in mime_types if mime_type.strip()]
+        self.max_size_mb = max_size_mb
+        self.folder_id = folder_id or None
+        if order and order not in BACKUP_ORDERS:
+            raise ValueError(f"Unknown backup order '{order}', expected one of {', '.join(BACKUP_ORDERS)}")
+        self.order = order or None
+    
+    def get_folder_query(self):
+        """Return the query terms that apply to folders."""
+        terms = [f"mimeType = '{FOLDER_MIME_TYPE}'"]
+        if self.skip_trashed:
+            terms.append("trashed = false")
+        return " and ".join(terms)
+    
+    def get_file_query(self):
+        """Return the query terms that apply to everything but folders."""
+        terms = [f"mimeType != '{FOLDER_MIME_TYPE}'"]
+        if self.skip_trashed:
+            terms.append("trashed = false")
+        if self.owned_only:
+            terms.append("'me' in owners")
+        if self.modified_after:
+            terms.append(f"modifiedTime > '{escape_query_value(self.modified_after)}'")
+        if self.mime_types:
+            terms.append("(" + " or ".join(
+                f"mimeType = '{escape_query_value(mime_type)}'" for mime_type in self.mime_types) + ")")
+        return " and ".join(terms)
+    
+    def get_order_by(self):
+        return BACKUP_ORDERS.get(self.order)
+    
+    def matches(self, file, files_by_id=None):
+        """Apply the selection to a file that did not come from a filtered listing, e.g. a change.
+        
+        The folder rule needs files_by_id to walk up the tree and is skipped
+        without it.
+        """
+        if self.skip_trashed and file.get('trashed'):
+            return False
+        if self.folder_id and files_by_id is not None and not self.is_in_folder(file, files_by_id):
+            return False
+        if file['mimeType'] == FOLDER_MIME_TYPE:
+            return True
+        if self.owned_only and file.get('ownedByMe') is False:
+            return False
+        if self.modified_after and file.get('modifiedTime', '') <= self.modified_after:
+            return False
+        if self.mime_types and file['mimeType'] not in self.mime_types:
+            return False
+        return self.is_within_size(file)
+    
+    def is_within_size(self, file):
+        return not self.max_size_mb or int(file.get('size') or 0) <= self.max_size_mb * 1048576
+    
+    def is_in_folder(self, file, files_by_id):
+        seen = set()
+        parents = file.get('parents') or []
+        while parents and parents[0] not in seen:
+            if parents[0] == self.folder_id:
+                return True
+            seen.add(parents[0])
+            parents = (files_by_id.get(parents[0]) or {}).get('parents') or []
+        return False
+    
+    def sort(self, files):
+        """Sort files that did not come from an ordered listing into the selected order, in place."""
+        if self.order in ('smallest', 'largest'):
+            files.sort(key=lambda file: int(file.get('size') or 0), reverse=self.order == 'largest')
+        elif self.order in ('recent', 'oldest'):
+            files.sort(key=lambda file: file.get('modifiedTime', ''), reverse=self.order == 'recent')
+        elif self.order == 'name':
+            files.sort(key=lambda file: file['name'])
+
+class DriveBackup:
+    """Backs up Google Drive accounts through a service account with domain-wide delegation.
+    
+    Settings are plain values. Log lines are passed to on_log(line) and
+    progress to on_progress(value, maximum); both may be called from worker
+    threads. Without on_log, lines are written to stdout. Every line also
+    goes to the "drivebackup" logger, and to log_file if one is given.
+    """
+    
+    def __init__(self, service_account_path, backup_dir, admin_email="", concurrency=DEFAULT_CONCURRENCY,
+                 chunk_size_mb=DEFAULT_CHUNK_SIZE_MB, incremental=False, deduplicate=False,
+                 parallel_users=DEFAULT_PARALLEL_USERS, global_limit=DEFAULT_GLOBAL_LIMIT, on_log=None, on_progress=None,
+                 log_file=None, export_concurrency=DEFAULT_EXPORT_CONCURRENCY, extra_export_formats=(),
+                 archive_format=None, volume_size_mb=DEFAULT_VOLUME_SIZE_MB,
+                 range_threshold_mb=DEFAULT_RANGE_THRESHOLD_MB, range_connections=DEFAULT_RANGE_CONNECTIONS,
+                 selection=None, metrics_dir=None):
+        self.service_account_path = service_account_path
+        self.backup_dir = backup_dir
+        self.admin_email = admin_email
+        self.concurrency = max(1, concurrency)
+        self.export_concurrency = max(1, export_concurrency)
+        self.chunk_size_mb = chunk_size_mb
+        self.range_threshold_mb = range_threshold_mb
+        self.range_connections = max(1, range_connections)
+        # Filters and order for full backups
+        self.selection = selection or BackupSelection()
+        self.incremental = incremental
+        self.deduplicate = deduplicate
+        # Full backups go into zip or tar.zst volumes instead of a folder tree when set
+        self.archive_format = archive_format or None
+        self.volume_size_mb = volume_size_mb
+        self.parallel_users = max(1, parallel_users)
+        self.global_limit = max(1, global_limit)
+        self.on_log = on_log
+        self.on_progress = on_progress
+        
+        # Per-thread state for pool workers (each one holds its own Drive service)
+        self.worker_local = threading.local()
+        
+        # One request budget for every worker and user, adapted to Drive's rate limits
+        self.rate_limiter = RateLimiter()
+        
+        # Timings and counters of the running backup; JSON lines and Prometheus files go to metrics_dir if set
+        self.metrics_dir = metrics_dir
+        self.metrics = BackupMetrics()
+        self.metrics_lock = threading.Lock()
+        self.metrics_runs = 0
+        
+        if log_file:
+            try:
+                open_log_file(log_file)
+            except OSError as e:
+                self.log(f"Could not open log file {log_file}: {str(e)}")
+        
+        # Extensions such as 'pdf' that Workspace files are exported to besides their main format
+        self.extra_export_formats = []
+        known_formats = {extension for formats in EXTRA_EXPORT_FORMATS.values() for extension in formats}
+        for extension in extra_export_formats:
+            extension = extension.strip().lower().lstrip('.')
+            if extension and extension not in known_formats:
+                self.log(f"Unknown export format '{extension}', ignoring it")
+            elif extension and extension not in self.extra_export_formats:
+                self.extra_export_formats.append(extension)
+    
+    def log(self, message):
+        message = f"{getattr(self.worker_local, 'log_prefix', '')}{message}"
+        logger.info(message)
+        
+        line = f"[{datetime.now().strftime('%H:%M:%S')}] {message}\n"
+        if self.on_log:
+            self.on_log(line)
+        else:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+    
+    def set_progress(self, value=None, maximum=None):
+        if self.on_progress:
+            self.on_progress(value, maximum)
+    
+    def get_chunk_size(self):
+        """Return the download chunk size in bytes."""
+        return int(self.chunk_size_mb * 1024 * 1024)
+    
+    def start_metrics(self):
+        """Start collecting metrics for a run, unless it is part of a run that already does (bulk backups)."""
+        with self.metrics_lock:
+            self.metrics_runs += 1
+            if self.metrics_runs > 1:
+                return
+            
+            jsonl_path = None
+            if self.metrics_dir:
+                jsonl_path = os.path.join(self.metrics_dir,
+                                          f"drivebackup_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+            try:
+                if jsonl_path:
+                    os.makedirs(self.metrics_dir, exist_ok=True)
+                self.metrics = BackupMetrics(jsonl_path)
+            except OSError as e:
+                self.log(f"Could not open metrics file {jsonl_path}: {str(e)}")
+                self.metrics = BackupMetrics()
+    
+    def finish_metrics(self):
+        """Log the timing summary and write the metrics files once the outermost run is over."""
+        with self.metrics_lock:
+            self.metrics_runs -= 1
+            if self.metrics_runs:
+                return
+        
+        self.log("Timing summary:")
+        for line in self.metrics.get_summary_lines():
+            self.log(line)
+        if self.metrics_dir:
+            prometheus_path = os.path.join(self.metrics_dir, PROMETHEUS_FILE_NAME)
+            try:
+                self.metrics.write_prometheus(prometheus_path)
+                self.log(f"Metrics saved to: {prometheus_path}")
+            except OSError as e:
+                self.log(f"Could not write metrics to {prometheus_path}: {str(e)}")
+        self.metrics.close()
+    
+    def get_delegated_credentials(self, user_email):
+        """Load the service account credentials and impersonate the user."""
+        from google.oauth2 import service_account
+        
+        credentials = service_account.Credentials.from_service_account_file(
+            self.service_account_path, 
+            scopes=['https://www.googleapis.com/auth/drive']
+        )
+        
+        # Use domain-wide delegation to impersonate the user
+        return credentials.with_subject(user_email)
+    
+    def authenticate_service(self, user_email, credentials=None):
+        """Authenticate and build the Drive API service."""
+        from googleapiclient.discovery import build
+        
+        try:
+            if credentials is None:
+                credentials = self.get_delegated_credentials(user_email)
+            
+            # Build the Drive API service
+            service = build('drive', 'v3', credentials=credentials)
+            
+            self.log(f"Successfully authenticated and impersonating user {user_email}")
+            return service
+        
+        except Exception as e:
+            self.log(f"Authentication error: {str(e)}")
+            return None
+    
+    def open_journal(self, path):
+        """Open the checkpoint journal at path, starting a new one if the old one is too old to resume."""
+        journal = CheckpointJournal(path)
+        if journal.is_expired():
+            self.log(f"Discarding checkpoint older than {CHECKPOINT_MAX_AGE_HOURS} hours; starting over")
+            journal.discard()
+            journal = CheckpointJournal(path)
+        return journal
+    
+    def download_specific_files(self, user_email, file_names):
+        """Download every file of a user matching one of the given names.
+        
+        Returns {'found', 'downloaded', 'skipped', 'failed'} file counts, or
+        None if the run failed. Items of types that cannot be backed up, such
+        as shortcuts and Forms, count as skipped rather than failed.
+        """
+        journal = None
+        folder_cache = None
+        verification = None
+        export_cache = None
+        self.start_metrics()
+        try:
+            file_names = [name.strip() for name in file_names if name.strip()]
+            
+            self.log(f"Found {len(file_names)} file names to search for")
+            
+            if not file_names:
+                self.log("No valid file names provided")
+                return None
+            
+            # Authenticate
+            with self.metrics.span("auth"):
+                credentials = self.get_delegated_credentials(user_email)
+                service = self.authenticate_service(user_email, credentials)
+            if not service:
+                self.log("Authentication failed!")
+                return None
+            
+            # Prepare backup directory
+            user_root_dir = os.path.join(
+                self.backup_dir,
+                f"{user_email.replace('@', '_at_')}"
+            )
+            user_backup_dir = os.path.join(user_root_dir, "specific_files")
+            os.makedirs(user_backup_dir, exist_ok=True)
+            
+            # Pick up where an interrupted download left off
+            journal = self.open_journal(os.path.join(user_root_dir, SPECIFIC_CHECKPOINT_FILE_NAME))
+            folder_cache = FolderCache(os.path.join(user_root_dir, FOLDER_CACHE_FILE_NAME))
+            verification = VerificationReport(os.path.join(user_backup_dir, VERIFICATION_REPORT_FILE_NAME))
+            export_cache = ExportCache(os.path.join(user_root_dir, EXPORT_CACHE_FILE_NAME))
+            
+            # Search for all names with as few OR-combined queries as possible
+            self.log(f"Searching for {len(file_names)} file names...")
+            matches = self.find_files_by_name(service, file_names)
+            
+            found_files = {}
+            for file_name in file_names:
+                files = matches.get(file_name.lower(), [])
+                if not files:
+                    self.log(f"No files found with the name: {file_name}")
+                    continue
+                
+                self.log(f"Found {len(files)} files with the name: {file_name}")
+                found_files.update({file['id']: file for file in files})
+            
+            total_files_found = len(found_files)
+            
+            # Look up every ancestor folder of every match together, in batches
+            with self.metrics.span("ancestor_lookup"):
+                all_files_dict = self.get_ancestor_folders(service, found_files.values(), folder_cache)
+            all_files_dict.update(found_files)
+            
+            jobs = []
+            path_cache = {}
+            claimed_paths = set()
+            for file in found_files.values():
+                # Determine file path based on parent folders
+                relative_path = self.get_file_path(file['id'], file['name'], all_files_dict, path_cache)
+                relative_path = self.claim_path(file, relative_path, claimed_paths)
+                jobs.append((file, os.path.join(user_backup_dir, relative_path), relative_path))
+            
+            # Download all matches in parallel
+            self.log(f"Downloading {len(jobs)} files with {self.concurrency} workers...")
+            self.set_progress(0, len(jobs))
+            
+            results = {'completed': 0, 'downloaded': 0, 'skipped': 0}
+            
+            def on_done(job, local_path):
+                results['completed'] += 1
+                if local_path:
+                    results['downloaded'] += 1
+                    journal.mark_completed(job[0], local_path)
+                elif not self.is_supported(job[0]):
+                    results['skipped'] += 1
+                self.set_progress(results['completed'])
+            
+            def make_jobs():
+                for job in jobs:
+                    # Skip files finished by an earlier, interrupted attempt
+                    local_path = journal.get_completed(job[0])
+                    if local_path:
+                        on_done(job, local_path)
+                        continue
+                    yield job
+            
+            self.run_worker_pool(make_jobs(), self.process_file, on_done, self.concurrency, credentials, journal,
+                                 verification=verification, store=self.get_blob_store(),
+                                 export_workers=self.export_concurrency, export_cache=export_cache)
+            
+            self.log(f"Download completed! Found {total_files_found} files, successfully downloaded {results['downloaded']}.")
+            if results['skipped']:
+                self.log(f"Skipped {results['skipped']} items of types that cannot be backed up.")
+            self.log(f"Files saved to: {user_backup_dir}")
+            self.log(f"Checksums: {verification.passed} verified, {verification.failed} mismatched "
+                     f"(see {VERIFICATION_REPORT_FILE_NAME})")
+            
+            # Keep the checkpoint while anything is missing, so the next attempt only fetches what is left
+            failed = total_files_found - results['downloaded'] - results['skipped']
+            if not failed:
+                journal.discard()
+                journal = None
+            else:
+                self.log("Some files failed; run the download again to resume where it stopped.")
+            return {'found': total_files_found, 'downloaded': results['downloaded'], 'skipped': results['skipped'],
+                    'failed': failed}
+            
+        except Exception as e:
+            self.log(f"Error during download: {str(e)}")
+            return None
+        
+        finally:
+            if journal:
+                journal.close()
+            if folder_cache:
+                folder_cache.close()
+            if verification:
+                verification.close()
+            if export_cache:
+                export_cache.close()
+            self.finish_metrics()
+    
+    def find_files_by_name(self, service, file_names):
+        """Search for files by exact name, combining names into OR queries.
+        
+        Returns a dict of lower-cased name -> list of matching files.
+        """
+        matches = {}
+        
+        # Pack as many name clauses into each query as the length limit allows
+        queries = join_query_clauses(
+            [f"name = '{escape_query_value(file_name)}'" for file_name in dict.fromkeys(file_names)])
+        
+        self.set_progress(0, len(queries))
+        
+        for query_index, query in enumerate(queries):
+            page_token = None
+            
+            while True:
+                response = self.call_api(service.files().list(
+                    q=query,
+                    spaces='drive',
+                    fields='nextPageToken, files(id, name, mimeType, parents)',
+                    pageSize=1000,
+                    pageToken=page_token,
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True
+                ).execute)
+                
+                for file in response.get('files', []):
+                    matches.setdefault(file['name'].lower(), []).append(file)
+                page_token = response.get('nextPageToken')
+                
+                if not page_token:
+                    break
+            
+            self.set_progress(query_index + 1)
+        
+        return matches
+    
+    def get_ancestor_folders(self, service, files, folder_cache=None):
+        """Fetch the metadata of every ancestor folder of the given files.
+        
+        Works one tree level at a time, fetching all unseen parents of that
+        level through batch requests, so the number of round trips grows
+        with folder depth rather than with the number of files. Folders
+        already in folder_cache are not fetched again.
+        """
+        folders = {}
+        to_visit = {parent_id for file in files for parent_id in file.get('parents', [])}
+        fetch_count = 0
+        
+        while to_visit:
+            to_fetch = []
+            next_visit = set()
+            for folder_id in to_visit:
+                cached = folder_cache.get(folder_id) if folder_cache else None
+                if cached:
+                    folders[folder_id] = cached
+                    next_visit.update(cached['parents'])
+                else:
+                    to_fetch.append(folder_id)
+            
+            if to_fetch:
+                fetched = self.batch_get_files(service, sorted(to_fetch))
+                fetch_count += len(fetched)
+                folders.update(fetched)
+                if folder_cache:
+                    folder_cache.update(fetched.values())
+                next_visit.update(parent_id for folder in fetched.values() for parent_id in folder.get('parents', []))
+            
+            to_visit = {folder_id for folder_id in next_visit if folder_id not in folders}
+        
+        self.log(f"Resolved {len(folders)} parent folders ({len(folders) - fetch_count} from cache)")
+        return folders
+    
+    def batch_get_files(self, service, file_ids):
+        """Get id, name and parents for many files using Drive batch requests.
+        
+        Calls inside a batch that are rate limited are sent again in a later
+        batch after backing off.
+        """
+        results = {}
+        
+        for attempt in range(MAX_API_RETRIES + 1):
+            rate_limited = []
+            
+            def callback(request_id, response, exception):
+                if exception and is_rate_limit_error(exception) and attempt < MAX_API_RETRIES:
+                    rate_limited.append(request_id)
+                elif exception:
+                    self.log(f"Error getting file info: {str(exception)}")
+                else:
+                    results[response['id']] = response
+            
+            for start in range(0, len(file_ids), MAX_BATCH_SIZE):
+                batch = service.new_batch_http_request(callback=callback)
+                for file_id in file_ids[start:start + MAX_BATCH_SIZE]:
+                    batch.add(service.files().get(fileId=file_id, fields='id, name, parents', supportsAllDrives=True),
+                              request_id=file_id)
+                self.call_api(batch.execute)
+            
+            if not rate_limited:
+                break
+            
+            self.rate_limiter.on_rate_limited()
+            self.backoff(attempt, f"{len(rate_limited)} batched lookups were rate limited")
+            file_ids = rate_limited
+        
+        return results
+    
+    def bulk_backup(self, user_emails):
+        """Back up every user, several at a time, and write a summary report.
+        
+        Returns the per-user reports, or None if the run failed.
+        """
+        self.start_metrics()
+        try:
+            if not user_emails:
+                self.log("No users found to back up.")
+                return None
+            
+            self.log(f"Starting bulk backup of {len(user_emails)} users, {self.parallel_users} at a time, "
+                     f"at most {self.global_limit} downloads in flight overall")
+            
+            # Every user's worker pool draws from the same pool of download slots
+            global_slots = threading.BoundedSemaphore(self.global_limit)
+            self.set_progress(0, len(user_emails))
+            
+            reports = []
+            with ThreadPoolExecutor(max_workers=self.parallel_users) as pool:
+                futures = [pool.submit(self.backup_user, user_email, global_slots, False) for user_email in user_emails]
+                for future in as_completed(futures):
+                    reports.append(future.result())
+                    self.set_progress(len(reports))
+            
+            # Summary report
+            report_path = os.path.join(self.backup_dir, f"bulk_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            self.write_bulk_report(reports, report_path)
+            
+            self.log(f"\nBulk backup complete: {sum(1 for r in reports if r['status'] == 'ok')} of {len(reports)} users succeeded.")
+            self.log_report_table(reports, 'user')
+            self.log(f"Report saved to: {report_path}")
+            return reports
+            
+        except Exception as e:
+            self.log(f"Error during bulk backup: {str(e)}")
+            return None
+        
+        finally:
+            self.finish_metrics()
+    
+    def backup_shared_drives(self, user_email, drive_names=()):
+        """Back up every shared drive user_email is a member of, each into a tree of its own.
+        
+        drive_names, if given, limits the backup to the drives with those
+        names or IDs. Drives are listed and downloaded parallel_users at a
+        time, each with its own listing and worker pools, and all of them
+        share global_limit download slots. Returns the per-drive reports, or
+        None if the run failed.
+        """
+        self.start_metrics()
+        try:
+            with self.metrics.span("auth"):
+                service = self.authenticate_service(user_email)
+            if not service:
+                self.log("Authentication failed!")
+                return None
+            
+            drives = self.list_shared_drives(service)
+            wanted = {name.strip() for name in drive_names if name.strip()}
+            if wanted:
+                drives = [drive for drive in drives if drive['id'] in wanted or drive['name'] in wanted]
+            if not drives:
+                self.log("No shared drives found to back up.")
+                return []
+            
+            self.log(f"Starting backup of {len(drives)} shared drives, {self.parallel_users} at a time, "
+                     f"at most {self.global_limit} downloads in flight overall")
+            
+            global_slots = threading.BoundedSemaphore(self.global_limit)
+            self.set_progress(0, len(drives))
+            
+            reports = []
+            with ThreadPoolExecutor(max_workers=self.parallel_users) as pool:
+                futures = [pool.submit(self.backup_user, user_email, global_slots, False, drive) for drive in drives]
+                for future in as_completed(futures):
+                    reports.append(future.result())
+                    self.set_progress(len(reports))
+            
+            report_path = os.path.join(self.backup_dir, SHARED_DRIVES_DIR_NAME,
+                                       f"shared_drives_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            self.write_bulk_report(reports, report_path)
+            
+            self.log(f"\nShared drive backup complete: {sum(1 for r in reports if r['status'] == 'ok')} of "
+                     f"{len(reports)} drives succeeded.")
+            self.log_report_table(reports, 'drive')
+            self.log(f"Report saved to: {report_path}")
+            return reports
+            
+        except Exception as e:
+            self.log(f"Error during shared drive backup: {str(e)}")
+            return None
+        
+        finally:
+            self.finish_metrics()
+    
+    def list_shared_drives(self, service):
+        """Return the ID and name of every shared drive the user is a member of."""
+        drives = []
+        page_token = None
+        while True:
+            response = self.call_api(service.drives().list(
+                pageSize=100,
+                fields='nextPageToken, drives(id, name)',
+                pageToken=page_token
+            ).execute)
+            
+            drives.extend(response.get('drives', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return drives
+    
+    def verify_backup(self):
+        """Re-hash every file in the verification reports and archive indexes under the backup directory.
+        
+        Drive is not contacted. Archive entries are reported as
+        <volume>:<entry>. Returns the number of files per status, or None if
+        the run failed.
+        """
+        try:
+            backup_dir = self.backup_dir
+            expected = self.load_verification_reports(backup_dir)
+            archives = self.load_archive_indexes(backup_dir)
+            if not expected and not archives:
+                self.log(f"No {VERIFICATION_REPORT_FILE_NAME} or {ARCHIVE_INDEX_FILE_NAME} files found under {backup_dir}")
+                return None
+            
+            total = len(expected) + sum(len(entries) for entries in archives.values())
+            workers = os.cpu_count() or 1
+            self.log(f"Verifying {total} files on {workers} CPU cores...")
+            self.set_progress(0, total)
+            
+            counts = {'passed': 0, 'failed': 0, 'missing': 0, 'unverified': 0}
+            report_path = os.path.join(backup_dir, f"verification_audit_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+            with open(report_path, 'w', newline='') as f, ProcessPoolExecutor(max_workers=workers) as pool:
+                writer = csv.writer(f)
+                writer.writerow(['path', 'expected_md5', 'actual_md5', 'status'])
+                checked = 0
+                
+                def check(relative_path, expected_md5, actual_md5):
+                    nonlocal checked
+                    if actual_md5 is None:
+                        status = 'missing'
+                    elif not expected_md5:
+                        status = 'unverified'
+                    elif actual_md5 == expected_md5:
+                        status = 'passed'
+                    else:
+                        status = 'failed'
+                    counts[status] += 1
+                    
+                    writer.writerow([relative_path, expected_md5, actual_md5 or '', status])
+                    if status in ('failed', 'missing'):
+                        self.log(f"{status.upper()}: {relative_path}")
+                    checked += 1
+                    if checked % 100 == 0 or checked == total:
+                        self.set_progress(checked)
+                
+                for path, actual_md5 in pool.map(hash_file, list(expected), chunksize=VERIFY_BATCH_SIZE):
+                    check(os.path.relpath(path, backup_dir), expected[path], actual_md5)
+                
+                # Each volume is read from start to end once, by one process
+                for volume_path, digests in pool.map(hash_archive_volume, list(archives)):
+                    relative_volume = os.path.relpath(volume_path, backup_dir)
+                    for name, expected_md5 in archives[volume_path].items():
+                        check(f"{relative_volume}:{name}", expected_md5, (digests or {}).get(name))
+            
+            self.log(f"\nVerification complete: {counts['passed']} passed, {counts['failed']} failed, "
+                     f"{counts['missing']} missing, {counts['unverified']} without a checksum.")
+            self.log(f"Report saved to: {report_path}")
+            return counts
+            
+        except Exception as e:
+            self.log(f"Error during verification: {str(e)}")
+            return None
+    
+    def load_verification_reports(self, backup_dir):
+        """Collect the checksum each backed-up file should have, keyed by absolute path.
+        
+        Drive's md5Checksum is used where there is one, otherwise the hash
+        recorded when the file was written. Later rows for a path win, since
+        a failed attempt is followed by the retry that replaced it.
+        """
+        expected = {}
+        for dir_path, _, file_names in os.walk(backup_dir):
+            if VERIFICATION_REPORT_FILE_NAME not in file_names:
+                continue
+            with open(os.path.join(dir_path, VERIFICATION_REPORT_FILE_NAME), newline='') as f:
+                for row in csv.DictReader(f):
+                    path = os.path.normpath(os.path.join(dir_path, row['path']))
+                    expected[path] = row['expected_md5'] or row['actual_md5']
+        return expected
+    
+    def load_archive_indexes(self, backup_dir):
+        """Collect the checksum of every indexed archive entry, as {volume path: {entry name: md5}}.
+        
+        Later lines for an entry win, like rows in the verification reports.
+        """
+        archives = {}
+        for dir_path, _, file_names in os.walk(backup_dir):
+            if ARCHIVE_INDEX_FILE_NAME not in file_names:
+                continue
+            with open(os.path.join(dir_path, ARCHIVE_INDEX_FILE_NAME)) as f:
+                for line in f:
+                    row = json.loads(line)
+                    if row.get('volume'):
+                        volume_path = os.path.normpath(os.path.join(dir_path, row['volume']))
+                        archives.setdefault(volume_path, {})[row['path']] = row['expected_md5'] or row['actual_md5']
+        return archives
+    
+    def log_report_table(self, reports, key):
+        """Log one line per report, named by its key column ('user' or 'drive')."""
+        self.log(f"{key.capitalize():<40}{'Status':<8}{'Files':>8}{'Failed':>8}{'MB':>10}{'MB/s':>8}")
+        for report in sorted(reports, key=lambda r: r[key]):
+            self.log(f"{report[key]:<40}{report['status']:<8}{report['files']:>8}{report['failed']:>8}"
+                     f"{report['bytes'] / 1048576:>10.1f}{report['mb_per_second']:>8.2f}")
+    
+    def write_bulk_report(self, reports, report_path):
+        """Write one CSV row per user or shared drive with throughput, bytes and failures."""
+        os.makedirs(os.path.dirname(report_path), exist_ok=True)
+        columns = ['user', 'status', 'files', 'succeeded', 'skipped', 'failed', 'bytes', 'seconds', 'mb_per_second',
+                   'error']
+        if any('drive' in report for report in reports):
+            columns.insert(1, 'drive')
+        with open(report_path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            for report in reports:
+                writer.writerow(report)
+    
+    def backup_user(self, user_email, global_slots=None, show_progress=True, shared_drive=None):
+        """Back up one user's Drive and return a report of what happened.
+        
+        global_slots, if given, is a semaphore shared with other users being
+        backed up at the same time that caps the total downloads in flight.
+        With shared_drive (a drives.list entry), that shared drive is backed
+        up instead, as user_email, into a tree of its own under the
+        shared drives folder.
+        """
+        report = {'user': user_email, 'status': 'failed', 'files': 0, 'succeeded': 0, 'skipped': 0, 'failed': 0,
+                  'bytes': 0, 'seconds': 0, 'mb_per_second': 0, 'error': ''}
+        drive_id = shared_drive['id'] if shared_drive else None
+        if shared_drive:
+            report['drive'] = shared_drive['name']
+        started = time.time()
+        manifest = None
+        journal = None
+        folder_cache = None
+        verification = None
+        export_cache = None
+        archive = None
+        # Archive entries cannot be hardlinked, so there is nothing to deduplicate into
+        store = self.get_blob_store() if not self.archive_format else None
+        
+        # Tag log lines with the user or drive when several backups run at once
+        self.worker_local.log_prefix = "" if show_progress else f"[{report.get('drive', user_email)}] "
+        self.start_metrics()
+        try:
+            if shared_drive:
+                self.log(f"Starting backup of shared drive {shared_drive['name']} as {user_email}")
+            else:
+                self.log(f"Starting backup for user: {user_email}")
+            
+            # Reset progress bar
+            if show_progress:
+                self.set_progress(0)
+            
+            # Prepare backup directory
+            if shared_drive:
+                user_root_dir = os.path.join(self.backup_dir, SHARED_DRIVES_DIR_NAME,
+                                             get_shared_drive_dir_name(shared_drive))
+            else:
+                user_root_dir = os.path.join(
+                    self.backup_dir,
+                    f"{user_email.replace('@', '_at_')}"
+                )
+            user_backup_dir = os.path.join(user_root_dir, datetime.now().strftime("%Y-%m-%d"))
+            os.makedirs(user_root_dir, exist_ok=True)
+            
+            if self.archive_format:
+                # Unfinished volumes cannot be appended to, so an interrupted archive run starts over
+                os.makedirs(user_backup_dir, exist_ok=True)
+                self.log(f"Backup directory: {user_backup_dir} ({self.archive_format} volumes)")
+                archive = ArchiveSet(user_backup_dir, self.archive_format, int(self.volume_size_mb * 1048576))
+                verification = archive
+                if self.deduplicate:
+                    self.log("Deduplication does not apply to archive output, every file is stored in full.")
+            else:
+                # Resume an interrupted backup into the snapshot it had started
+                journal = self.open_journal(os.path.join(user_root_dir, BACKUP_CHECKPOINT_FILE_NAME))
+                resume_dir = journal.get_state('target_dir')
+                if resume_dir:
+                    user_backup_dir = resume_dir
+                    self.log(f"Resuming interrupted backup into {user_backup_dir}")
+                else:
+                    journal.set_state('target_dir', user_backup_dir)
+                export_cache = ExportCache(os.path.join(user_root_dir, EXPORT_CACHE_FILE_NAME))
+                
+                os.makedirs(user_backup_dir, exist_ok=True)
+                self.log(f"Backup directory: {user_backup_dir}")
+                verification = VerificationReport(os.path.join(user_backup_dir, VERIFICATION_REPORT_FILE_NAME))
+            
+            # Authenticate
+            self.log("Authenticating...")
+            with self.metrics.span("auth"):
+                credentials = self.get_delegated_credentials(user_email)
+                service = self.authenticate_service(user_email, credentials)
+            if not service:
+                self.log("Authentication failed!")
+                report['error'] = "Authentication failed"
+                return report
+            
+            previous_files = {}
+            changed_ids = None
+            
+            if self.incremental:
+                manifest = BackupManifest(os.path.join(user_root_dir, MANIFEST_FILE_NAME))
+                start_page_token = manifest.get_state('start_page_token')
+            
+            if manifest and start_page_token:
+                # Only ask Drive for what changed since the last run
+                self.log("Incremental backup: fetching changes since the last run...")
+                previous_files = manifest.get_files()
+                changes, new_page_token = self.list_changes(service, start_page_token, drive_id)
+                self.log(f"Found {len(changes)} changes since the last backup.")
+                
+                current_files = dict(previous_files)
+                changed_ids = set()
+                for change in changes:
+                    if change.get('removed'):
+                        current_files.pop(change['fileId'], None)
+                        manifest.remove_file(change['fileId'])
+                    elif change.get('file'):
+                        current_files[change['fileId']] = change['file']
+                        changed_ids.add(change['fileId'])
+                
+                # Changes are not filtered by Drive, so apply the selection here
+                selected_files = [file for file in current_files.values()
+                                  if self.selection.matches(file, current_files)]
+                self.selection.sort(selected_files)
+                pages = [selected_files]
+            else:
+                if manifest:
+                    # Take the token before listing so nothing changed during the listing is missed
+                    self.log("Incremental backup: no previous manifest, running a full backup first.")
+                    new_page_token = self.call_api(service.changes().getStartPageToken(
+                        driveId=drive_id, supportsAllDrives=True).execute)['startPageToken']
+                
+                # Stream the file list so downloads start while later pages are still being fetched
+                self.log("Fetching file list...")
+                pages = self.prefetch(self.list_file_pages(service, drive_id))
+            
+            # Paths resolve as soon as the folders above an item have been listed; a shared drive's ID is its root folder
+            resolver = PathResolver(self.selection.folder_id or drive_id or self.get_root_folder_id(service))
+            
+            # Share the folder tree we see with later specific-file downloads
+            folder_cache = FolderCache(os.path.join(user_root_dir, FOLDER_CACHE_FILE_NAME))
+            
+            results = {'listed': 0, 'queued': 0, 'completed': 0, 'success': 0, 'skipped': 0, 'linked': 0, 'resumed': 0,
+                       'bytes': 0}
+            
+            def on_done(job, local_path):
+                results['completed'] += 1
+                if local_path:
+                    results['success'] += 1
+                    if journal:
+                        journal.mark_completed(job[0], local_path)
+                elif not self.is_supported(job[0]):
+                    # Shortcuts, Forms, Sites and the like cannot be backed up; that is not a failure
+                    results['skipped'] += 1
+                if manifest:
+                    file = job[0]
+                    manifest.record_file(file, os.path.relpath(local_path, user_root_dir) if local_path else None)
+                    if results['completed'] % 1000 == 0:
+                        manifest.commit()
+                if show_progress:
+                    self.set_progress(results['completed'])
+            
+            def on_downloaded(job, local_path):
+                # Count the bytes saved in this run, every export format included; archives count their own.
+                # What was linked from the store or earlier exports is taken off again below
+                file = job[0]
+                if local_path and file['mimeType'] in GOOGLE_EXPORT_FORMATS and not archive:
+                    results['bytes'] += sum(os.path.getsize(f"{job[1]}.{extension}")
+                                            for extension, _ in self.get_export_formats(file))
+                elif local_path and file['mimeType'] != FOLDER_MIME_TYPE and not archive:
+                    results['bytes'] += os.path.getsize(local_path)
+                on_done(job, local_path)
+            
+            claimed_paths = set()
+            
+            def make_job(file, relative_path):
+                relative_path = self.claim_path(file, relative_path, claimed_paths)
+                full_path = os.path.join(user_backup_dir, relative_path)
+                job = (file, full_path, relative_path)
+                
+                # Skip files finished by an earlier, interrupted attempt
+                local_path = journal.get_completed(file) if journal else None
+                if local_path:
+                    results['resumed'] += 1
+                    on_done(job, local_path)
+                    return None
+                
+                # Link files that are unchanged since the previous snapshot instead of downloading them.
+                # Archives get every file written into their volumes, as a loose link would not be restorable
+                previous = previous_files.get(file['id'])
+                if changed_ids is not None and not archive and self.is_unchanged(file, previous, user_root_dir):
+                    local_path = self.link_previous_file(
+                        os.path.join(user_root_dir, previous['local_path']), file, full_path)
+                    if local_path:
+                        results['linked'] += 1
+                        verification.record(local_path, file, previous.get('md5Checksum'), 'linked')
+                        on_done(job, local_path)
+                        return None
+                
+                results['queued'] += 1
+                self.log(f"Processing {results['queued']}/{results['listed']}: {relative_path}")
+                return job
+            
+            def make_jobs():
+                for page in pages:
+                    results['listed'] += len(page)
+                    folder_cache.update(file for file in page if file['mimeType'] == FOLDER_MIME_TYPE)
+                    if show_progress:
+                        self.set_progress(maximum=results['listed'])
+                    
+                    # Time path resolution per page; per item it would drown in timer overhead
+                    resolve_started = time.perf_counter()
+                    ready = [item for file in page for item in resolver.add(file)]
+                    self.metrics.observe("path_resolution", time.perf_counter() - resolve_started)
+                    for ready_file, relative_path in ready:
+                        job = make_job(ready_file, relative_path)
+                        if job:
+                            yield job
+                
+                self.log(f"Found {results['listed']} files to process.")
+                if len(resolver):
+                    self.log(f"Resolving {len(resolver)} paths whose parent folder was not listed.")
+                with self.metrics.span("path_resolution"):
+                    ready = resolver.finish()
+                for ready_file, relative_path in ready:
+                    job = make_job(ready_file, relative_path)
+                    if job:
+                        yield job
+            
+            # Download and export files on a bounded worker pool
+            concurrency = self.concurrency
+            self.log(f"Downloading with {concurrency} parallel workers, exporting with {self.export_concurrency}")
+            self.run_worker_pool(make_jobs(), self.process_file, on_downloaded, concurrency, credentials, journal,
+                                 global_slots, verification, store, self.export_concurrency, export_cache, archive)
+            
+            file_count = results['listed']
+            if not file_count:
+                self.log("No files found to backup.")
+                report['status'] = 'ok'
+                return report
+            
+            if results['resumed']:
+                self.log(f"Skipped {results['resumed']} files already finished before the interruption.")
+            
+            if manifest:
+                # Only move the change token forward once the whole run has been recorded
+                manifest.set_state('start_page_token', new_page_token)
+                manifest.commit()
+                self.log(f"Linked {results['linked']} unchanged files from the previous snapshot.")
+            
+            # Backup completed
+            self.log(f"\nBackup complete! Successfully processed {results['success']} out of {file_count} files.")
+            if results['skipped']:
+                self.log(f"Skipped {results['skipped']} items of types that cannot be backed up.")
+            failed = file_count - results['success'] - results['skipped']
+            self.log(f"Backup location: {user_backup_dir}")
+            self.log(f"Checksums: {verification.passed} verified, {verification.failed} mismatched "
+                     f"(see {ARCHIVE_INDEX_FILE_NAME if archive else VERIFICATION_REPORT_FILE_NAME})")
+            if store:
+                self.log(f"Deduplicated {store.hits} files ({store.bytes_saved / 1048576:.1f} MB not downloaded)")
+            
+            # Keep the checkpoint while anything failed, so the next run resumes instead of starting over
+            if journal and not failed:
+                journal.discard()
+                journal = None
+            elif journal:
+                self.log("Some files failed; the next run resumes this backup where it stopped.")
+            if archive:
+                results['bytes'] = archive.bytes_written
+            
+            # Files linked from the store and reused exports were not fetched from Drive
+            downloaded_bytes = (results['bytes'] - (store.bytes_saved if store else 0)
+                                - (export_cache.bytes_saved if export_cache else 0))
+            report.update(status='ok', files=file_count, succeeded=results['success'], skipped=results['skipped'],
+                          failed=failed, bytes=downloaded_bytes)
+            
+        except Exception as e:
+            self.log(f"Error during backup: {str(e)}")
+            report['error'] = str(e)
+        
+        finally:
+            if manifest:
+                manifest.close()
+            if journal:
+                journal.close()
+            if folder_cache:
+                folder_cache.close()
+            if verification:
+                verification.close()
+            if export_cache:
+                export_cache.close()
+            self.finish_metrics()
+            self.worker_local.log_prefix = ""
+        
+        report['seconds'] = round(time.time() - started, 1)
+        if report['seconds']:
+            report['mb_per_second'] = round(report['bytes'] / 1048576 / report['seconds'], 2)
+        return report
+    
+    def list_changes(self, service, page_token, drive_id=None):
+        """Fetch every change since page_token, in the given shared drive if any.
+        
+        Returns (changes, new start page token).
+        """
+        changes = []
+        
+        while True:
+            with self.metrics.span("listing"):
+                response = self.call_api(service.changes().list(
+                    pageToken=page_token,
+                    pageSize=1000,
+                    spaces='drive',
+                    driveId=drive_id,
+                    fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))",
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True
+                ).execute)
+            
+            changes.extend(response.get('changes', []))
+            
+            if 'newStartPageToken' in response:
+                return changes, response['newStartPageToken']
+            page_token = response['nextPageToken']
+    
+    def is_unchanged(self, file, previous, user_root_dir):
+        """Check whether a file still matches what the previous snapshot holds.
+        
+        Workspace files are never linked here; the export cache reuses each
+        of their formats separately.
+        """
+        if not previous or not previous.get('local_path') or file['mimeType'] == FOLDER_MIME_TYPE:
+            return False
+        if file['mimeType'] in GOOGLE_EXPORT_FORMATS:
+            return False
+        if not os.path.exists(os.path.join(user_root_dir, previous['local_path'])):
+            return False
+        return (file.get('modifiedTime') == previous.get('modifiedTime')
+                and file.get('md5Checksum') == previous.get('md5Checksum'))
+    
+    def link_previous_file(self, source_path, file, full_path):
+        """Hardlink (or copy) a file from the previous snapshot. Returns the new local path."""
+        local_path = self.get_local_path(file, full_path)
+        try:
+            self.link_file(source_path, local_path)
+            return local_path
+        except OSError as e:
+            self.log(f"Could not reuse previous copy of {file['name']}, downloading again: {str(e)}")
+            return None
+    
+    def link_file(self, source_path, target_path):
+        """Hardlink source_path to target_path, copying it where hardlinks are not possible."""
+        if os.path.exists(target_path):
+            # Already there, e.g. a second run on the same day
+            if os.path.samefile(source_path, target_path):
+                return
+            os.remove(target_path)
+        
+        dir_path = os.path.dirname(target_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            # Hardlinks unsupported or across filesystems
+            shutil.copy2(source_path, target_path)
+    
+    def call_api(self, call):
+        """Run a Drive API call within the shared rate limit.
+        
+        Rate-limit (403/429) and server (5xx) errors are retried with
+        exponential backoff; rate limits also slow the shared limiter down.
+        Each attempt is timed as an "api:<method>" span, and the time spent
+        waiting for the rate limiter as rate_limit_wait.
+        """
+        from googleapiclient.errors import HttpError
+        
+        operation = f"api:{get_api_method(call)}"
+        for attempt in range(MAX_API_RETRIES + 1):
+            with self.metrics.span("rate_limit_wait"):
+                self.rate_limiter.acquire()
+            self.metrics.count("api_calls", method=operation[4:])
+            started = time.perf_counter()
+            try:
+                result = call()
+            except HttpError as e:
+                self.metrics.observe(operation, time.perf_counter() - started, ok=False)
+                if not is_retryable_error(e) or attempt == MAX_API_RETRIES:
+                    raise
+                if is_rate_limit_error(e):
+                    self.rate_limiter.on_rate_limited()
+                self.metrics.count("api_retries", reason=get_error_reason(e) or str(e.resp.status))
+                self.backoff(attempt, f"Drive returned {e.resp.status} {get_error_reason(e)}".strip())
+            else:
+                self.metrics.observe(operation, time.perf_counter() - started)
+                self.rate_limiter.on_success()
+                return result
+    
+    def backoff(self, attempt, reason):
+        """Sleep for an exponentially growing, jittered delay."""
+        delay = min(MAX_BACKOFF_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1)
+        self.log(f"{reason}, retrying in {delay:.1f}s")
+        time.sleep(delay)
+    
+    def init_worker(self, credentials, journal, verification, store, export_cache, archive, log_prefix):
+        """Give each pool thread its own Drive service, since the client is not thread-safe."""
+        from googleapiclient.discovery import build
+        
+        self.worker_local.service = build('drive', 'v3', credentials=credentials)
+        self.worker_local.credentials = credentials
+        self.worker_local.journal = journal
+        self.worker_local.verification = verification
+        self.worker_local.store = store
+        self.worker_local.export_cache = export_cache
+        self.worker_local.archive = archive
+        self.worker_local.log_prefix = log_prefix
+    
+    def run_worker_pool(self, jobs, worker, on_done, max_workers, credentials, journal=None, global_slots=None,
+                        verification=None, store=None, export_workers=None, export_cache=None, archive=None):
+        """Run worker(service, job) for every job on bounded thread pools.
+        
+        Jobs are pulled lazily with at most twice as many in flight as a pool
+        has workers, and on_done(job, result) is called on the calling thread
+        once each job is final. If export_workers is given, Workspace exports
+        run on a pool of that size of their own, so slow conversions cannot
+        hold up downloads. Jobs that fail go to a retry queue that is worked
+        through again after the main pass, so files are not silently left
+        out. If global_slots is given, each download also holds one of its
+        slots while it runs. Checksum results are written to verification,
+        file contents are shared through store, exports are reused through
+        export_cache and everything is written into archive instead of
+        separate files, if given.
+        """
+        pending = {}
+        retry_queue = []
+        log_prefix = getattr(self.worker_local, 'log_prefix', "")
+        initargs = (credentials, journal, verification, store, export_cache, archive, log_prefix)
+        
+        pools = {'download': ThreadPoolExecutor(max_workers=max_workers, initializer=self.init_worker, initargs=initargs)}
+        limits = {'download': max_workers * 2}
+        if export_workers:
+            pools['export'] = ThreadPoolExecutor(max_workers=export_workers, initializer=self.init_worker,
+                                                 initargs=initargs)
+            limits['export'] = export_workers * 2
+        queued = {kind: deque() for kind in pools}
+        in_flight = {kind: 0 for kind in pools}
+        
+        def run_job(job, slots):
+            if slots is None:
+                return worker(self.worker_local.service, job)
+            with slots:
+                return worker(self.worker_local.service, job)
+        
+        def submit_ready():
+            for kind, pool in pools.items():
+                while queued[kind] and in_flight[kind] < limits[kind]:
+                    job = queued[kind].popleft()
+                    # Exports are bounded by their own pool, so only downloads take a global slot
+                    pending[pool.submit(run_job, job, global_slots if kind == 'download' else None)] = (job, kind)
+                    in_flight[kind] += 1
+                self.metrics.gauge(f"{kind}_jobs_queued", len(queued[kind]))
+                self.metrics.gauge(f"{kind}_jobs_in_flight", in_flight[kind])
+        
+        def finish(future, final):
+            job, kind = pending.pop(future)
+            in_flight[kind] -= 1
+            result = future.result()
+            if result is None and not final and self.is_supported(job[0]):
+                retry_queue.append(job)
+            else:
+                if result is None and final:
+                    self.log(f"FAILED after {RETRY_ROUNDS} retries: {job[2]}")
+                on_done(job, result)
+        
+        def wait_for_jobs(final):
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future, final)
+            submit_ready()
+        
+        def run_jobs(jobs, final):
+            for job in jobs:
+                kind = 'export' if 'export' in pools and job[0]['mimeType'] in GOOGLE_EXPORT_FORMATS else 'download'
+                queued[kind].append(job)
+                submit_ready()
+                
+                # Pause pulling new jobs while too many are waiting for a worker
+                while len(queued[kind]) >= MAX_QUEUED_JOBS:
+                    wait_for_jobs(final)
+            
+            while pending:
+                wait_for_jobs(final)
+        
+        try:
+            run_jobs(jobs, False)
+            
+            # Work through the retry queue, waiting longer before each round
+            for retry_round in range(1, RETRY_ROUNDS + 1):
+                if not retry_queue:
+                    break
+                
+                retry_jobs = list(retry_queue)
+                retry_queue.clear()
+                self.log(f"Retrying {len(retry_jobs)} failed files in {RETRY_DELAY_SECONDS * retry_round}s "
+                         f"(round {retry_round}/{RETRY_ROUNDS})")
+                time.sleep(RETRY_DELAY_SECONDS * retry_round)
+                run_jobs(retry_jobs, retry_round == RETRY_ROUNDS)
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+    
+    def process_file(self, service, job):
+        """Download, export or create a single Drive item. Returns the local path on success."""
+        file, full_path, relative_path = job
+        mime_type = file['mimeType']
+        archive = getattr(self.worker_local, 'archive', None)
+        
+        try:
+            # Create directory if needed
+            dir_path = os.path.dirname(full_path)
+            if dir_path and not archive:
+                os.makedirs(dir_path, exist_ok=True)
+            
+            # Handle Google Docs, Sheets, Slides, etc.
+            if mime_type in GOOGLE_EXPORT_FORMATS:
+                # The document only counts as backed up once every format has been saved
+                if all(self.export_google_doc(service, file, export_mime_type, f"{full_path}.{extension}")
+                       for extension, export_mime_type in self.get_export_formats(file)):
+                    return self.get_local_path(file, full_path)
+            
+            elif mime_type == FOLDER_MIME_TYPE:
+                # Just create the folder
+                if archive:
+                    archive.add_directory(full_path)
+                else:
+                    os.makedirs(full_path, exist_ok=True)
+                self.log(f"Created folder: {relative_path}")
+                return full_path
+            
+            # Regular files
+            elif 'vnd.google-apps' not in mime_type:
+                if self.download_file(service, file, full_path):
+                    return full_path
+            
+            else:
+                self.log(f"Skipping unsupported file type: {mime_type}")
+        
+        except Exception as e:
+            self.log(f"Error processing {relative_path}: {str(e)}")
+        
+        return None
+    
+    def is_supported(self, file):
+        """Check whether a Drive item is something this tool can back up."""
+        mime_type = file['mimeType']
+        return (mime_type in GOOGLE_EXPORT_FORMATS or mime_type == FOLDER_MIME_TYPE
+                or 'vnd.google-apps' not in mime_type)
+    
+    def get_export_formats(self, file):
+        """Return (extension, export MIME type) for every format a Workspace file is saved in, main format first."""
+        export_mime_type, extension = GOOGLE_EXPORT_FORMATS[file['mimeType']]
+        formats = [(extension, export_mime_type)]
+        extra_formats = EXTRA_EXPORT_FORMATS.get(file['mimeType'], {})
+        for extra_extension in self.extra_export_formats:
+            if extra_extension in extra_formats and extra_extension != extension:
+                formats.append((extra_extension, extra_formats[extra_extension]))
+        return formats
+    
+    def claim_path(self, file, relative_path, claimed_paths):
+        """Return relative_path, with the file ID added if another item of the run already saves there.
+        
+        Drive allows several items with the same name in one folder; without
+        this they would download into the same file at the same time.
+        Same-named folders are merged into one.
+        """
+        key = os.path.normcase(self.get_local_path(file, relative_path))
+        if key in claimed_paths and file['mimeType'] != FOLDER_MIME_TYPE:
+            root, extension = os.path.splitext(relative_path)
+            relative_path = f"{root} ({file['id']}){extension}"
+            key = os.path.normcase(self.get_local_path(file, relative_path))
+        claimed_paths.add(key)
+        return relative_path
+    
+    def get_local_path(self, file, full_path):
+        """Return the path a Drive item is saved under, including any export extension."""
+        if file['mimeType'] in GOOGLE_EXPORT_FORMATS:
+            return f"{full_path}.{GOOGLE_EXPORT_FORMATS[file['mimeType']][1]}"
+        return full_path
+    
+    def list_file_pages(self, service, drive_id=None):
+        """Yield the files in the user's Drive, or in the shared drive drive_id, one page at a time.
+        
+        Folders are listed before everything else so a file's path is
+        normally known the moment it arrives. The selection's filters and
+        order are applied by Drive; with a folder selected only its subtree
+        is listed, one level of folders at a time, and the order holds
+        within each batch of parent folders. Errors are raised rather than
+        swallowed so a broken listing fails the backup instead of passing
+        for an empty Drive.
+        """
+        selection = self.selection
+        
+        def all_pages():
+            if selection.folder_id:
+                yield from self.list_subtree_pages(service, selection, drive_id)
+            else:
+                yield from self.list_query_pages(service, selection.get_folder_query(), drive_id=drive_id)
+                yield from self.list_query_pages(service, selection.get_file_query(), selection.get_order_by(),
+                                                 drive_id)
+        
+        retrieved = 0
+        for items in all_pages():
+            # Drive cannot filter on size
+            items = [file for file in items if file['mimeType'] == FOLDER_MIME_TYPE or selection.is_within_size(file)]
+            retrieved += len(items)
+            self.log(f"Retrieved {retrieved} files so far...")
+            yield items
+    
+    def list_subtree_pages(self, service, selection, drive_id=None):
+        """Yield the pages of the selected folder's subtree, folders first.
+        
+        Drive cannot query a whole subtree, so its folders are listed one
+        level at a time, with as many parents per query as fit, and then the
+        files in all of them.
+        """
+        folder_ids = {selection.folder_id: None}
+        level = [selection.folder_id]
+        while level:
+            next_level = []
+            for parents in join_query_clauses([f"'{escape_query_value(folder_id)}' in parents" for folder_id in level]):
+                for items in self.list_query_pages(service, f"({parents}) and {selection.get_folder_query()}",
+                                                   drive_id=drive_id):
+                    # A folder can sit in several parents of the same level
+                    next_level.extend(folder['id'] for folder in items if folder['id'] not in folder_ids)
+                    folder_ids.update((folder['id'], None) for folder in items)
+                    yield items
+            level = next_level
+        
+        for parents in join_query_clauses([f"'{escape_query_value(folder_id)}' in parents" for folder_id in folder_ids]):
+            yield from self.list_query_pages(service, f"({parents}) and {selection.get_file_query()}",
+                                             selection.get_order_by(), drive_id)
+    
+    def list_query_pages(self, service, query, order_by=None, drive_id=None):
+        """Yield the results of one files.list query one page at a time.
+        
+        With drive_id the query covers that shared drive only; otherwise it
+        covers what the user owns or can see outside shared drives.
+        """
+        page_token = None
+        while True:
+            with self.metrics.span("listing"):
+                results = self.call_api(service.files().list(
+                    q=query,
+                    pageSize=1000,
+                    fields=f"nextPageToken, files({FILE_FIELDS})",
+                    orderBy=order_by,
+                    corpora='drive' if drive_id else None,
+                    driveId=drive_id,
+                    pageToken=page_token,
+                    includeItemsFromAllDrives=True,
+                    supportsAllDrives=True
+                ).execute)
+            
+            yield results.get('files', [])
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+    
+    def get_root_folder_id(self, service):
+        """Return the ID of the user's My Drive folder, or None if it cannot be fetched."""
+        try:
+            return self.call_api(service.files().get(fileId='root', fields='id').execute)['id']
+        except Exception as e:
+            self.log(f"Could not look up the My Drive folder, paths will resolve once listing ends: {str(e)}")
+            return None
+    
+    def prefetch(self, items, max_ahead=LISTING_PREFETCH_PAGES):
+        """Iterate over items on a background thread, staying up to max_ahead items ahead.
+        
+        The items iterator runs on its own thread, so anything it uses (such
+        as a Drive service) must not be used elsewhere until it is exhausted.
+        Errors it raises are re-raised to the consumer.
+        """
+        buffer = queue.Queue(maxsize=max_ahead)
+        stopped = threading.Event()
+        end = object()
+        log_prefix = getattr(self.worker_local, 'log_prefix', "")
+        
+        def put(entry):
+            # Give up if the consumer went away, e.g. the backup failed
+            while not stopped.is_set():
+                try:
+                    buffer.put(entry, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+        
+        def produce():
+            self.worker_local.log_prefix = log_prefix
+            try:
+                for item in items:
+                    if not put((item, None)):
+                        return
+            except Exception as e:
+                put((end, e))
+            else:
+                put((end, None))
+        
+        threading.Thread(target=produce, daemon=True).start()
+        try:
+            while True:
+                item, error = buffer.get()
+                if item is end:
+                    if error:
+                        raise error
+                    return
+                yield item
+        finally:
+            stopped.set()
+    
+    def get_file_path(self, file_id, file_name, files_dict, path_cache=None):
+        """Determine the file path based on parent folders.
+        
+        Pass the same path_cache for every file of a run so each folder's
+        path is only worked out once.
+        """
+        if path_cache is None:
+            path_cache = {}
+        
+        if file_id in path_cache:
+            return path_cache[file_id]
+        
+        file_info = files_dict.get(file_id)
+        if not file_info:
+            return file_name
+        
+        # Get parent IDs
+        parents = file_info.get('parents', [])
+        
+        if not parents:
+            path = file_name
+        else:
+            parent_id = parents[0]  # Take the first parent
+            parent_info = files_dict.get(parent_id)
+            
+            if not parent_info:
+                path = file_name
+            else:
+                parent_path = self.get_file_path(parent_id, parent_info['name'], files_dict, path_cache)
+                path = os.path.join(parent_path, file_name)
+        
+        path_cache[file_id] = path
+        return path
+    
+    def stream_to_file(self, request, file_path, version=None, expected_md5=None, size=None):
+        """Write a media request to disk one chunk at a time. Returns the md5 of the bytes written.
+        
+        Chunks go to a temporary file next to the target, which is renamed
+        into place once the download has finished. When a version is given
+        and the run has a checkpoint journal, the offset reached is recorded
+        after every chunk so an interrupted download of known size continues
+        from there with Range requests instead of starting over. The content is hashed
+        as it is written; if it does not match expected_md5 the temporary
+        file is dropped and ChecksumMismatchError is raised. When the run
+        writes an archive, the content goes into it instead.
+        """
+        from googleapiclient.http import MediaIoBaseDownload
+        
+        if getattr(self.worker_local, 'archive', None):
+            return self.stream_to_archive(request, file_path, expected_md5, size)
+        
+        temp_path = f"{file_path}.part"
+        journal = getattr(self.worker_local, 'journal', None) if version else None
+        md5 = hashlib.md5()
+        
+        offset = 0
+        if journal and size and os.path.exists(temp_path):
+            offset = min(journal.get_partial_offset(temp_path, version), os.path.getsize(temp_path))
+        
+        try:
+            with open(temp_path, 'r+b' if offset else 'wb') as f:
+                # Drop anything written after the last recorded chunk
+                f.truncate(offset)
+                
+                f.seek(0)
+                if offset:
+                    # Hash the part kept from the interrupted attempt before appending to it
+                    for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+                        md5.update(block)
+                
+                writer = HashingWriter(f, md5, self.metrics)
+                chunk_size = self.get_chunk_size()
+                if offset:
+                    # MediaIoBaseDownload always starts at byte 0, so fetch the rest range by range here
+                    self.log(f"Resuming {os.path.basename(file_path)} from byte {offset}")
+                    while offset < size:
+                        end = min(offset + chunk_size, size) - 1
+                        request.headers['range'] = f"bytes={offset}-{end}"
+                        content = self.call_api(request.execute)
+                        if len(content) != end - offset + 1:
+                            raise OSError(f"Drive returned {len(content)} bytes for range {offset}-{end}")
+                        writer.write(content)
+                        offset += len(content)
+                        if journal and offset < size:
+                            f.flush()
+                            journal.set_partial_offset(temp_path, version, offset)
+                else:
+                    downloader = MediaIoBaseDownload(writer, request, chunksize=chunk_size)
+                    done = False
+                    while not done:
+                        status, done = self.call_api(downloader.next_chunk)
+                        if journal and not done:
+                            f.flush()
+                            journal.set_partial_offset(temp_path, version, status.resumable_progress)
+            
+            return self.finish_download(temp_path, file_path, journal, md5.hexdigest(), expected_md5)
+        except Exception:
+            # Keep resumable partial files for the next attempt, drop the rest
+            if not journal and os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def finish_download(self, temp_path, file_path, journal, actual_md5, expected_md5=None):
+        """Move a completed temporary file into place if its md5 matches. Returns the md5."""
+        if expected_md5 and actual_md5 != expected_md5:
+            # Start the next attempt from scratch rather than resuming corrupt data
+            if journal:
+                journal.clear_partial(temp_path)
+            os.remove(temp_path)
+            raise ChecksumMismatchError(expected_md5, actual_md5)
+        
+        os.replace(temp_path, file_path)
+        if journal:
+            journal.clear_partial(temp_path)
+        return actual_md5
+    
+    def download_ranges(self, file, file_path, version=None, expected_md5=None):
+        """Download a large file over several connections at once. Returns the md5 of the content.
+        
+        The file is preallocated as a temporary file next to the target,
+        sparse where the filesystem allows, and split into chunk-sized byte
+        ranges. range_connections threads fetch those ranges in parallel,
+        each with a Drive service of its own. Ranges are hashed in order as
+        soon as everything before them has arrived, while they are still in
+        the page cache. The end of that verified prefix is checkpointed like
+        the offset of a normal download, so an interrupted download resumes
+        from there.
+        """
+        from googleapiclient.discovery import build
+        
+        size = int(file['size'])
+        chunk_size = self.get_chunk_size()
+        credentials = self.worker_local.credentials
+        temp_path = f"{file_path}.part"
+        journal = getattr(self.worker_local, 'journal', None) if version else None
+        md5 = hashlib.md5()
+        
+        offset = 0
+        if journal and os.path.exists(temp_path):
+            offset = min(journal.get_partial_offset(temp_path, version), os.path.getsize(temp_path))
+        
+        ranges = iter([(start, min(start + chunk_size, size) - 1) for start in range(offset, size, chunk_size)])
+        ranges_lock = threading.Lock()
+        completed = queue.Queue()
+        stop = threading.Event()
+        
+        def fetch_ranges():
+            try:
+                service = build('drive', 'v3', credentials=credentials)
+                with open(temp_path, 'r+b') as f:
+                    while not stop.is_set():
+                        with ranges_lock:
+                            byte_range = next(ranges, None)
+                        if byte_range is None:
+                            break
+                        
+                        start, end = byte_range
+                        request = service.files().get_media(fileId=file['id'])
+                        request.headers['range'] = f"bytes={start}-{end}"
+                        content = self.call_api(request.execute)
+                        if len(content) != end - start + 1:
+                            raise OSError(f"Drive returned {len(content)} bytes for range {start}-{end}")
+                        with self.metrics.span("disk_write"):
+                            f.seek(start)
+                            f.write(content)
+                            f.flush()
+                        self.metrics.count("bytes_downloaded", len(content))
+                        completed.put(byte_range)
+            except Exception as e:
+                completed.put(e)
+            finally:
+                # Tell the hashing loop this connection has finished
+                completed.put(None)
+        
+        threads = []
+        try:
+            # Unbuffered, so no read-ahead can keep bytes of a range from before its connection wrote it
+            with open(temp_path, 'r+b' if offset else 'w+b', buffering=0) as f:
+                # Reserve the full size up front; most filesystems do not write anything for this
+                f.truncate(size)
+                
+                # Hash the part kept from the interrupted attempt before fetching the rest
+                f.seek(0)
+                remaining = offset
+                while remaining:
+                    block = f.read(min(HASH_BLOCK_SIZE, remaining))
+                    md5.update(block)
+                    remaining -= len(block)
+                if offset:
+                    self.log(f"Resuming {os.path.basename(file_path)} from byte {offset}")
+                
+                connections = min(self.range_connections, max(1, -(-(size - offset) // chunk_size)))
+                threads = [threading.Thread(target=fetch_ranges, daemon=True) for _ in range(connections)]
+                for thread in threads:
+                    thread.start()
+                
+                arrived = {}
+                error = None
+                running = len(threads)
+                while running:
+                    item = completed.get()
+                    if item is None:
+                        running -= 1
+                        continue
+                    if isinstance(item, Exception):
+                        error = error or item
+                        stop.set()
+                        continue
+                    
+                    # Hash every range that now continues the verified prefix
+                    arrived[item[0]] = item[1]
+                    while offset in arrived:
+                        end = arrived.pop(offset)
+                        f.seek(offset)
+                        while offset <= end:
+                            block = f.read(min(HASH_BLOCK_SIZE, end - offset + 1))
+                            md5.update(block)
+                            offset += len(block)
+                    if journal:
+                        journal.set_partial_offset(temp_path, version, offset)
+                
+                if error:
+                    raise error
+            
+            return self.finish_download(temp_path, file_path, journal, md5.hexdigest(), expected_md5)
+        except Exception:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            # Keep resumable partial files for the next attempt, drop the rest
+            if not journal and os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+    
+    def stream_to_archive(self, request, file_path, expected_md5=None, size=None):
+        """Write a media request into the run's archive as the entry for file_path. Returns the md5.
+        
+        Nothing is staged on disk. An entry that fails, or whose content does
+        not match expected_md5, is not indexed and is left out of the archive
+        where the format allows it.
+        """
+        from googleapiclient.http import MediaIoBaseDownload
+        
+        md5 = hashlib.md5()
+        with self.worker_local.archive.open_entry(file_path, size) as entry:
+            downloader = MediaIoBaseDownload(HashingWriter(entry, md5, self.metrics), request,
+                                             chunksize=self.get_chunk_size())
+            done = False
+            while not done:
+                status, done = self.call_api(downloader.next_chunk)
+            
+            actual_md5 = md5.hexdigest()
+            if expected_md5 and actual_md5 != expected_md5:
+                raise ChecksumMismatchError(expected_md5, actual_md5)
+        return actual_md5
+    
+    def download_file(self, service, file, file_path):
+        """Download a file from Drive and check it against the md5Checksum Drive reports."""
+        expected_md5 = file.get('md5Checksum')
+        try:
+            # Content we already hold for another user or snapshot needs no download
+            if expected_md5 and self.link_from_store(expected_md5, file_path):
+                self.record_verification(file_path, file, expected_md5, 'deduplicated')
+                self.log(f"Linked {file['name']} from the backup store")
+                return True
+            
+            size = int(file['size']) if 'size' in file else None
+            version = expected_md5 or file.get('modifiedTime')
+            with self.metrics.span("download"):
+                if (size and size >= self.range_threshold_mb * 1048576 and self.range_connections > 1
+                        and not getattr(self.worker_local, 'archive', None)):
+                    # Archives are written front to back, so only files on disk are split into ranges
+                    actual_md5 = self.download_ranges(file, file_path, version, expected_md5)
+                else:
+                    request = service.files().get_media(fileId=file['id'])
+                    actual_md5 = self.stream_to_file(request, file_path, version, expected_md5, size)
+            self.record_verification(file_path, file, actual_md5, 'passed' if expected_md5 else 'unverified')
+            self.add_to_store(file_path, actual_md5)
+            
+            self.log("Downloaded file successfully")
+            return True
+        except ChecksumMismatchError as e:
+            self.record_verification(file_path, file, e.actual_md5, 'failed')
+            self.log(f"Error downloading file: {str(e)}")
+            return False
+        except Exception as e:
+            self.log(f"Error downloading file: {str(e)}")
+            return False
+    
+    def export_google_doc(self, service, file, mime_type, file_path):
+        """Export a Google Document to the specified MIME type, reusing an earlier export of the same version."""
+        export_cache = getattr(self.worker_local, 'export_cache', None)
+        try:
+            # Archive entries must hold the content, so earlier exports are only linked into folder trees
+            reuse = export_cache and not getattr(self.worker_local, 'archive', None)
+            cached = export_cache.get(file, mime_type) if reuse else None
+            if cached:
+                try:
+                    self.link_file(cached[0], file_path)
+                    export_cache.record_reuse(file_path)
+                    self.record_verification(file_path, file, cached[1], 'linked')
+                    self.log(f"Reused unchanged export of {file['name']}")
+                    return True
+                except OSError as e:
+                    self.log(f"Could not reuse earlier export of {file['name']}, exporting again: {str(e)}")
+            
+            with self.metrics.span("export"):
+                request = service.files().export_media(fileId=file['id'], mimeType=mime_type)
+                actual_md5 = self.stream_to_file(request, file_path)
+            # Drive has no checksum for exports; keep ours so later audits can spot changes on disk
+            self.record_verification(file_path, file, actual_md5, 'exported')
+            self.add_to_store(file_path, actual_md5)
+            if export_cache:
+                export_cache.record(file, mime_type, file_path, actual_md5)
+            
+            self.log("Exported file successfully")
+            return True
+        except Exception as e:
+            self.log(f"Error exporting file: {str(e)}")
+            return False
+    
+    def get_blob_store(self):
+        """Return the shared content store under the backup directory, or None if deduplication is off."""
+        if not self.deduplicate:
+            return None
+        return BlobStore(os.path.join(self.backup_dir, BLOB_STORE_DIR_NAME))
+    
+    def link_from_store(self, md5, file_path):
+        """Link stored content to file_path if the running job has a store holding it."""
+        store = getattr(self.worker_local, 'store', None)
+        if not store:
+            return False
+        try:
+            return store.link_to(md5, file_path)
+        except OSError as e:
+            self.log(f"Could not link from the backup store, downloading instead: {str(e)}")
+            return False
+    
+    def add_to_store(self, file_path, md5):
+        """Add a finished file to the running job's store, if there is one."""
+        store = getattr(self.worker_local, 'store', None)
+        if not store:
+            return
+        try:
+            store.add(file_path, md5)
+        except OSError as e:
+            # The file itself is fine, it just takes its own disk space
+            self.log(f"Could not add {os.path.basename(file_path)} to the backup store: {str(e)}")
+    
+    def record_verification(self, local_path, file, actual_md5, status):
+        """Add a checksum result to the verification report of the running job, if there is one."""
+        self.metrics.count("files", status=status)
+        verification = getattr(self.worker_local, 'verification', None)
+        if verification:
+            verification.record(local_path, file, actual_md5, status)
+
+def positive_int(value):
+    """argparse type for options that must be at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def positive_float(value):
+    """argparse type for options that must be greater than 0."""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+def iso_date(value):
+    """argparse type for a date or date and time such as 2024-01-31 or 2024-01-31T12:00:00."""
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date like 2024-01-31, got {value}")
+    return value
+
+def main(argv=None):
+    """Command line entry point. Returns the process exit code."""
+    parser = argparse.ArgumentParser(description="Back up Google Drive accounts without the GUI.")
+    parser.add_argument("--service-account", help="service account JSON key file (not needed for verify)")
+    parser.add_argument("--backup-dir", default=os.path.expanduser("~/DriveBackups"), help="where backups are written")
+    parser.add_argument("--admin-email", default="", help="Workspace admin the service account acts for")
+    parser.add_argument("--concurrency", type=positive_int, default=DEFAULT_CONCURRENCY, help="parallel downloads per user")
+    parser.add_argument("--chunk-size-mb", type=positive_float, default=DEFAULT_CHUNK_SIZE_MB, help="size of each download request")
+    parser.add_argument("--incremental", action="store_true", help="only download what changed since the last run")
+    parser.add_argument("--deduplicate", action="store_true", help="store each distinct file content once")
+    parser.add_argument("--export-workers", type=positive_int, default=DEFAULT_EXPORT_CONCURRENCY,
+                        help="parallel Google Docs/Sheets/Slides exports per user")
+    parser.add_argument("--export-formats", default="",
+                        help="comma separated extra formats to export Workspace files to, e.g. pdf,odt")
+    parser.add_argument("--range-threshold-mb", type=positive_float, default=DEFAULT_RANGE_THRESHOLD_MB,
+                        help="download files at least this large over several connections")
+    parser.add_argument("--range-connections", type=positive_int, default=DEFAULT_RANGE_CONNECTIONS,
+                        help="connections used for each such file")
+    parser.add_argument("--archive", choices=ARCHIVE_FORMATS,
+                        help="write full backups into zip or tar.zst volumes instead of a folder tree")
+    parser.add_argument("--volume-size-mb", type=positive_float, default=DEFAULT_VOLUME_SIZE_MB,
+                        help="start a new archive volume once one reaches this size")
+    selection_options = parser.add_argument_group("selection (full backups)")
+    selection_options.add_argument("--owned-only", action="store_true", help="skip files shared with the user")
+    selection_options.add_argument("--skip-trashed", action="store_true", help="skip files in the trash")
+    selection_options.add_argument("--modified-after", type=iso_date, help="only files modified after this date")
+    selection_options.add_argument("--mime-types", default="", help="comma separated MIME types to back up")
+    selection_options.add_argument("--max-size-mb", type=positive_float, help="skip files larger than this")
+    selection_options.add_argument("--folder-id", help="only back up this folder and everything below it")
+    selection_options.add_argument("--order", choices=BACKUP_ORDERS, help="process files in this order")
+    parser.add_argument("--log-file", help=f"full log file (default: {LOG_FILE_NAME} in the backup directory)")
+    parser.add_argument("--metrics-dir",
+                        help=f"write timing spans as JSON lines and {PROMETHEUS_FILE_NAME} for node_exporter here")
+    
+    commands = parser.add_subparsers(dest="command", required=True)
+    backup_parser = commands.add_parser("backup", help="back up one user's Drive")
+    backup_parser.add_argument("user_email")
+    
+    specific_parser = commands.add_parser("specific", help="download a user's files by name")
+    specific_parser.add_argument("user_email")
+    specific_parser.add_argument("file_names", nargs="+", help="file names to look for")
+    
+    bulk_parser = commands.add_parser("bulk", help="back up many users")
+    bulk_parser.add_argument("users", help="users CSV file or comma separated list of emails")
+    bulk_parser.add_argument("--parallel-users", type=positive_int, default=DEFAULT_PARALLEL_USERS)
+    bulk_parser.add_argument("--global-limit", type=positive_int, default=DEFAULT_GLOBAL_LIMIT,
+                             help="downloads in flight across all users")
+    
+    shared_parser = commands.add_parser("shared-drives", help="back up every shared drive a user is a member of")
+    shared_parser.add_argument("user_email", help="user whose shared drives are backed up")
+    shared_parser.add_argument("drives", nargs="*", help="only these drive names or IDs")
+    shared_parser.add_argument("--parallel-drives", dest="parallel_users", type=positive_int,
+                               default=DEFAULT_PARALLEL_USERS)
+    shared_parser.add_argument("--global-limit", type=positive_int, default=DEFAULT_GLOBAL_LIMIT,
+                               help="downloads in flight across all drives")
+    
+    commands.add_parser("verify", help="re-check the checksums of everything under the backup directory")
+    
+    args = parser.parse_args(argv)
+    if args.command != "verify" and not args.service_account:
+        parser.error("--service-account is required")
+    engine = DriveBackup(
+        args.service_account, args.backup_dir, admin_email=args.admin_email, concurrency=args.concurrency,
+        chunk_size_mb=args.chunk_size_mb, incremental=args.incremental, deduplicate=args.deduplicate,
+        parallel_users=getattr(args, 'parallel_users', DEFAULT_PARALLEL_USERS),
+        global_limit=getattr(args, 'global_limit', DEFAULT_GLOBAL_LIMIT),
+        log_file=args.log_file or os.path.join(args.backup_dir, LOG_FILE_NAME),
+        export_concurrency=args.export_workers, extra_export_formats=args.export_formats.split(","),
+        archive_format=args.archive, volume_size_mb=args.volume_size_mb,
+        range_threshold_mb=args.range_threshold_mb, range_connections=args.range_connections,
+        selection=BackupSelection(
+            owned_only=args.owned_only, skip_trashed=args.skip_trashed, modified_after=args.modified_after,
+            mime_types=args.mime_types.split(","), max_size_mb=args.max_size_mb, folder_id=args.folder_id,
+            order=args.order
+        ),
+        metrics_dir=args.metrics_dir
+    )
+    
+    # Exit with 1 whenever anything was left out, so schedulers can alert on it
+    if args.command == "backup":
+        report = engine.backup_user(args.user_email)
+        return 0 if report['status'] == 'ok' and not report['failed'] else 1
+    if args.command == "specific":
+        results = engine.download_specific_files(args.user_email, args.file_names)
+        return 0 if results is not None and not results['failed'] else 1
+    if args.command in ("bulk", "shared-drives"):
+        if args.command == "bulk":
+            reports = engine.bulk_backup(parse_user_list(args.users))
+        else:
+            reports = engine.backup_shared_drives(args.user_email, args.drives)
+        return 0 if reports is not None and all(r['status'] == 'ok' and not r['failed'] for r in reports) else 1
+    counts = engine.verify_backup()
+    return 0 if counts and not counts['failed'] and not counts['missing'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,318 @@
-#import tkinter as tk
+import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import paramiko
 import threading
 import configparser
+import codecs
 import os
-from datetime import datetime
+import queue
+import shlex
+import socket
+import time
+from datetime import datetime, timedelta
 import re
 
+# Matches a search stops at unless the settings give another limit
+DEFAULT_MATCH_LIMIT = 10000
+
+# Bytes read from the SSH channel at a time
+READ_CHUNK_SIZE = 65536
+
+# How long a search waits for output before checking whether it was cancelled (seconds)
+CANCEL_CHECK_SECONDS = 0.2
+
+# Result lines handed to the Text widget per update, and the longest a partial batch waits (seconds)
+RENDER_BATCH_LINES = 2000
+RENDER_INTERVAL_SECONDS = 0.2
+
+# Result lines shown at a time; the Text widget only ever holds one page
+PAGE_LINES = 5000
+
+# Seconds an unused SSH connection stays open, unless the settings give another timeout
+DEFAULT_IDLE_TIMEOUT = 300
+
+# Seconds between SSH keepalive packets, so firewalls do not drop idle pooled connections
+KEEPALIVE_SECONDS = 30
+
+# How often the pool looks for idle connections to close (seconds)
+EVICT_CHECK_SECONDS = 10
+
+# Config sections of servers searched along with [SERVER], e.g. [SERVER:mx2]; unset options come from [SERVER]
+SERVER_SECTION_PREFIX = "SERVER:"
+
+# Choice in the search tab that searches every configured server
+ALL_SERVERS = "All servers"
+
+# Line timestamps the merged results are sorted by: syslog ("Oct 18 12:34:56") and ISO 8601
+SYSLOG_TIME_RE = re.compile(r"([A-Z][a-z]{2}) +(\d{1,2}) (\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?")
+ISO_TIME_RE = re.compile(r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:[.,](\d{1,6})\d*)?(Z|[+-]\d{2}:?\d{2})?")
+MONTHS = {name: number for number, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+# Words that color a whole line, most important first. Each is matched in lower, Title and UPPER case
+SEVERITY_WORDS = [
+    ("error", ("error", "failed", "failure")),
+    ("warning", ("warning", "warn")),
+    ("info", ("info", "notice")),
+    ("success", ("success", "completed")),
+]
+
+class LogHighlighter:
+    """Colors log lines with a single compiled regex.
+    
+    The searched email, the keyword patterns and the severity words are
+    alternatives of one pattern, so a batch of lines is classified and
+    every highlight found in one finditer pass over the whole batch. Each
+    alternative ends in an empty group whose number tells which one
+    matched; unlike named groups around each alternative, this leaves
+    every alternative starting with a literal, which lets the regex
+    engine skip ahead to possible match starts instead of trying every
+    position. Severity words inside the email or a keyword do not count.
+    """
+    
+    def __init__(self, keyword_patterns, email=""):
+        alternatives = []
+        # Highlight tag and, for severity words, severity rank of each alternative in order
+        alternative_tags = []
+        if email:
+            alternatives.append(re.escape(email))
+            alternative_tags.append(("highlight", None))
+        for pattern, tag in keyword_patterns:
+            alternatives.append(pattern)
+            alternative_tags.append((tag, None))
+        for rank, (tag, words) in enumerate(SEVERITY_WORDS):
+            for word in words:
+                for variant in dict.fromkeys((word, word.capitalize(), word.upper())):
+                    alternatives.append(re.escape(variant))
+                    alternative_tags.append((tag, rank))
+        
+        # Group numbers count every group, including any inside the keyword patterns
+        self.group_tags = {}
+        group_count = 0
+        for alternative, tag in zip(alternatives, alternative_tags):
+            group_count += re.compile(alternative).groups + 1
+            self.group_tags[group_count] = tag
+        self.pattern = re.compile("|".join(f"(?:{alternative})()" for alternative in alternatives))
+    
+    def highlight_lines(self, lines):
+        """Return (base tag or None, [(start, end, tag), ...]) for each line, columns within the line."""
+        results = [[None, []] for _ in lines]
+        ranks = [len(SEVERITY_WORDS)] * len(lines)
+        line_starts = []
+        position = 0
+        for line in lines:
+            line_starts.append(position)
+            position += len(line) + 1
+        
+        line_index = 0
+        for match in self.pattern.finditer("\n".join(lines)):
+            start = match.start()
+            # Matches come in order, so the line they are on only ever moves forward
+            while line_index + 1 < len(line_starts) and line_starts[line_index + 1] <= start:
+                line_index += 1
+            
+            tag, rank = self.group_tags[match.lastindex]
+            if rank is None:
+                column = start - line_starts[line_index]
+                results[line_index][1].append((column, column + match.end() - start, tag))
+            elif rank < ranks[line_index]:
+                ranks[line_index] = rank
+                results[line_index][0] = tag
+        return results
+
+def parse_log_time(line, now):
+    """Return the local time a log line starts with, or None if it has no timestamp.
+    
+    Syslog timestamps carry no year; they are taken to be from the last
+    twelve months before now.
+    """
+    match = ISO_TIME_RE.match(line)
+    if match:
+        year, month, day, hour, minute, second = (int(value) for value in match.group(1, 2, 3, 4, 5, 6))
+        microsecond = int((match.group(7) or "0").ljust(6, "0"))
+        zone = match.group(8)
+        try:
+            if not zone:
+                return datetime(year, month, day, hour, minute, second, microsecond)
+            zone = "+00:00" if zone == "Z" else zone
+            aware = datetime.fromisoformat(f"{year:04}-{month:02}-{day:02}T{hour:02}:{minute:02}:{second:02}{zone}")
+            return aware.astimezone().replace(tzinfo=None, microsecond=microsecond)
+        except ValueError:
+            return None
+    
+    match = SYSLOG_TIME_RE.match(line)
+    if match and match.group(1) in MONTHS:
+        microsecond = int((match.group(6) or "0").ljust(6, "0"))
+        try:
+            time_of_day = (int(match.group(3)), int(match.group(4)), int(match.group(5)), microsecond)
+            parsed = datetime(now.year, MONTHS[match.group(1)], int(match.group(2)), *time_of_day)
+            if parsed > now + timedelta(days=1):
+                parsed = parsed.replace(year=now.year - 1)
+            return parsed
+        except ValueError:
+            return None
+    return None
+
+class LogMerger:
+    """Merges the time-ordered log lines of several servers into one time-ordered stream.
+    
+    A line can only be passed on once every server still searching has
+    sent a line at least as late, as until then one of them may still
+    send an earlier one. Lines without a timestamp keep the time of the
+    line before them, so continuation lines stay with their entry.
+    """
+    
+    def __init__(self, sources):
+        self.now = datetime.now()
+        self.open = set(sources)
+        # Source -> [(time, source, line)] not passed on yet, and the latest time it has sent
+        self.pending = {source: [] for source in sources}
+        self.latest = {source: datetime.min for source in sources}
+    
+    def add(self, source, lines):
+        latest = self.latest[source]
+        pending = self.pending[source]
+        for line in lines:
+            parsed = parse_log_time(line, self.now)
+            if parsed and parsed > latest:
+                latest = parsed
+            pending.append((latest, source, line))
+        self.latest[source] = latest
+    
+    def close(self, source):
+        """Mark a source as finished; it no longer holds back the others."""
+        self.open.discard(source)
+    
+    def pop_ready(self, flush=False):
+        """Return the (source, line) pairs no other source can come before any more, in time order.
+        
+        With flush, everything received is returned, for when the search
+        ends early.
+        """
+        ready = []
+        if flush or not self.open:
+            for source, pending in self.pending.items():
+                ready.extend(pending)
+                pending.clear()
+        else:
+            watermark = min(self.latest[source] for source in self.open)
+            for source, pending in self.pending.items():
+                count = 0
+                while count < len(pending) and pending[count][0] <= watermark:
+                    count += 1
+                ready.extend(pending[:count])
+                del pending[:count]
+        
+        # Stable, so lines with the same time keep their order within each server
+        ready.sort(key=lambda entry: entry[0])
+        return [(source, line) for _, source, line in ready]
+
+class SSHConnectionPool:
+    """Keeps one SSH connection per server open between searches.
+    
+    Every command gets a channel of its own on the shared transport, which
+    paramiko allows from several threads at once, so only the first search
+    pays for the key exchange and authentication. A connection found to
+    have dropped is replaced on its next use. One that nobody has used for
+    idle_timeout seconds is closed by a background thread.
+    """
+    
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, keepalive=KEEPALIVE_SECONDS):
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.lock = threading.Lock()
+        # Server key -> [client, commands using it, time of last use]
+        self.connections = {}
+        self.stopped = threading.Event()
+        threading.Thread(target=self._evict_loop, daemon=True).start()
+    
+    def acquire(self, key, connect):
+        """Return a live client for key, made with connect() if there is none. Pair with release(key, client)."""
+        with self.lock:
+            entry = self.connections.get(key)
+            if entry and self.is_alive(entry[0]):
+                entry[1] += 1
+                return entry[0]
+            if entry:
+                del self.connections[key]
+                entry[0].close()
+        
+        # Connect without holding the lock, as it can take seconds
+        client = connect()
+        transport = client.get_transport()
+        if transport:
+            transport.set_keepalive(self.keepalive)
+        
+        with self.lock:
+            entry = self.connections.get(key)
+            if entry and self.is_alive(entry[0]):
+                # Another thread connected first; use its connection
+                client.close()
+            else:
+                entry = self.connections[key] = [client, 0, time.monotonic()]
+            entry[1] += 1
+            return entry[0]
+    
+    def release(self, key, client, broken=False):
+        """Hand back a client from acquire(key); a broken one is closed straight away.
+        
+        The pool is only changed if client is still the one pooled for key,
+        so a thread returning a connection that has since been replaced
+        cannot affect the replacement.
+        """
+        with self.lock:
+            entry = self.connections.get(key)
+            if entry and entry[0] is client:
+                entry[1] -= 1
+                entry[2] = time.monotonic()
+                if broken:
+                    del self.connections[key]
+        if broken:
+            client.close()
+    
+    def exec_command(self, key, connect, command):
+        """Start command on the pooled connection for key and return (client, stdin, stdout, stderr).
+        
+        If the connection turns out to have dropped, it is replaced and the
+        command started on the new one. Call release(key, client) once done
+        with the output.
+        """
+        for attempt in range(2):
+            client = self.acquire(key, connect)
+            try:
+                return (client,) + tuple(client.exec_command(command))
+            except (paramiko.SSHException, EOFError, OSError):
+                self.release(key, client, broken=True)
+                if attempt:
+                    raise
+    
+    def is_alive(self, client):
+        transport = client.get_transport()
+        return transport is not None and transport.is_active()
+    
+    def evict_idle(self):
+        """Close connections that are not in use and have been idle for idle_timeout seconds."""
+        now = time.monotonic()
+        with self.lock:
+            idle = [key for key, (client, users, last_used) in self.connections.items()
+                    if not users and now - last_used >= self.idle_timeout]
+            clients = [self.connections.pop(key)[0] for key in idle]
+        for client in clients:
+            client.close()
+    
+    def _evict_loop(self):
+        while not self.stopped.wait(EVICT_CHECK_SECONDS):
+            self.evict_idle()
+    
+    def close(self):
+        """Close every connection and stop the eviction thread."""
+        self.stopped.set()
+        with self.lock:
+            clients = [entry[0] for entry in self.connections.values()]
+            self.connections = {}
+        for client in clients:
+            client.close()
+
 class RoundcubeLogViewer:
     def __init__(self, root):
         self.root = root
@@ -29,9 +335,29 @@ class RoundcubeLogViewer:
                 'key_path': os.path.expanduser('~/.ssh/id_rsa'),
                 'log_path': '/var/log/mail.log'
             }
+            self.config['SEARCH'] = {
+                'match_limit': str(DEFAULT_MATCH_LIMIT)
+            }
+            self.config['CONNECTION'] = {
+                'idle_timeout': str(DEFAULT_IDLE_TIMEOUT)
+            }
             with open(self.config_file, 'w') as f:
                 self.config.write(f)
         
+        # SSH connections stay open between searches and are closed after sitting idle
+        self.connection_pool = SSHConnectionPool(
+            self.config.getint('CONNECTION', 'idle_timeout', fallback=DEFAULT_IDLE_TIMEOUT))
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
+        # The running search; results of older, cancelled searches are dropped
+        self.search_id = 0
+        self.cancel_event = threading.Event()
+        
+        # Results of the last search, per page: (text pieces, {tag: Text widget indices within the page})
+        self.result_pages = []
+        self.result_count = 0
+        self.page_index = 0
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
@@ -64,6 +390,7 @@ class RoundcubeLogViewer:
         self.results_text.tag_configure("header", foreground="green", font=("TkDefaultFont", 10, "bold"))
         self.results_text.tag_configure("success", foreground="green")
         self.results_text.tag_configure("highlight", background="yellow")
+        self.results_text.tag_configure("host", foreground="purple")
         
         # Additional tag colors for specific keywords
         self.results_text.tag_configure("clean_pass", foreground="green", background="#E0FFE0")  # Light green background
@@ -99,6 +426,16 @@ class RoundcubeLogViewer:
         self.params_var = tk.StringVar()
         ttk.Entry(params_frame, textvariable=self.params_var, width=40).pack(side='left', padx=5)
         
+        # Servers to search
+        server_frame = ttk.Frame(self.search_frame)
+        server_frame.pack(fill='x', padx=10, pady=10)
+        
+        ttk.Label(server_frame, text="Servers:").pack(side='left')
+        self.server_choice_var = tk.StringVar(value=ALL_SERVERS)
+        self.server_choice = ttk.Combobox(server_frame, textvariable=self.server_choice_var, state='readonly', width=37)
+        self.server_choice.pack(side='left', padx=5)
+        self.update_server_choices()
+        
         # Search button
         btn_frame = ttk.Frame(self.search_frame)
         btn_frame.pack(fill='x', padx=10, pady=10)
@@ -110,6 +447,10 @@ class RoundcubeLogViewer:
         self.search_btn = ttk.Button(btn_frame, text="Search Logs", command=self.search_logs)
         self.search_btn.pack(side='right')
         
+        self.cancel_btn = ttk.Button(btn_frame, text="Cancel", command=self.cancel_search)
+        self.cancel_btn.pack(side='right', padx=10)
+        self.cancel_btn.config(state='disabled')
+        
         # Results area
         results_frame = ttk.LabelFrame(self.search_frame, text="Results")
         results_frame.pack(fill='both', expand=True, padx=10, pady=10)
@@ -126,6 +467,15 @@ class RoundcubeLogViewer:
         self.save_btn = ttk.Button(save_frame, text="Save Results", command=self.save_results)
         self.save_btn.pack(side='right')
         self.save_btn.config(state='disabled')
+        
+        # Page through large results instead of holding them all in the Text widget
+        self.prev_btn = ttk.Button(save_frame, text="< Previous", command=lambda: self.show_page(self.page_index - 1))
+        self.prev_btn.pack(side='left')
+        self.page_var = tk.StringVar()
+        ttk.Label(save_frame, textvariable=self.page_var).pack(side='left', padx=10)
+        self.next_btn = ttk.Button(save_frame, text="Next >", command=lambda: self.show_page(self.page_index + 1))
+        self.next_btn.pack(side='left')
+        self.update_page_controls()
     
     def setup_settings_tab(self):
         # Server settings
@@ -153,6 +503,18 @@ class RoundcubeLogViewer:
         self.port_var = tk.StringVar(value=self.config['SERVER']['port'])
         ttk.Entry(port_frame, textvariable=self.port_var, width=10).pack(side='left', padx=5)
         
+        ttk.Label(server_frame, text=f"More servers are searched along with this one when added to {self.config_file}\n"
+                                     f"as [{SERVER_SECTION_PREFIX}name] sections; options they leave out are taken from here.",
+                  foreground="gray").pack(anchor='w', padx=5, pady=5)
+        
+        # Idle timeout
+        idle_frame = ttk.Frame(server_frame)
+        idle_frame.pack(fill='x', padx=5, pady=5)
+        ttk.Label(idle_frame, text="Close Idle Connection After (s):").pack(side='left')
+        self.idle_timeout_var = tk.StringVar(value=self.config.get('CONNECTION', 'idle_timeout',
+                                                                   fallback=str(DEFAULT_IDLE_TIMEOUT)))
+        ttk.Entry(idle_frame, textvariable=self.idle_timeout_var, width=10).pack(side='left', padx=5)
+        
         # Authentication
         auth_frame = ttk.LabelFrame(self.settings_frame, text="Authentication")
         auth_frame.pack(fill='x', padx=10, pady=10)
@@ -187,6 +549,14 @@ class RoundcubeLogViewer:
         self.log_path_var = tk.StringVar(value=self.config['SERVER']['log_path'])
         ttk.Entry(log_path_frame, textvariable=self.log_path_var, width=40).pack(side='left', padx=5)
         
+        # Match limit
+        match_limit_frame = ttk.Frame(log_frame)
+        match_limit_frame.pack(fill='x', padx=5, pady=5)
+        ttk.Label(match_limit_frame, text="Max Matches:").pack(side='left')
+        self.match_limit_var = tk.StringVar(value=self.config.get('SEARCH', 'match_limit',
+                                                                  fallback=str(DEFAULT_MATCH_LIMIT)))
+        ttk.Entry(match_limit_frame, textvariable=self.match_limit_var, width=10).pack(side='left', padx=5)
+        
         # Save settings button
         btn_frame = ttk.Frame(self.settings_frame)
         btn_frame.pack(fill='x', padx=10, pady=10)
@@ -211,53 +581,104 @@ class RoundcubeLogViewer:
         self.config['SERVER']['key_path'] = self.key_path_var.get()
         self.config['SERVER']['log_path'] = self.log_path_var.get()
         
+        # Match limit and idle timeout must be positive numbers
+        try:
+            match_limit = int(self.match_limit_var.get())
+            idle_timeout = int(self.idle_timeout_var.get())
+            if match_limit < 1 or idle_timeout < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Max Matches and the idle timeout must be positive whole numbers")
+            return
+        for section in ('SEARCH', 'CONNECTION'):
+            if not self.config.has_section(section):
+                self.config.add_section(section)
+        self.config['SEARCH']['match_limit'] = str(match_limit)
+        self.config['CONNECTION']['idle_timeout'] = str(idle_timeout)
+        self.connection_pool.idle_timeout = idle_timeout
+        
         # Write config to file
         with open(self.config_file, 'w') as f:
             self.config.write(f)
+        self.update_server_choices()
         
         messagebox.showinfo("Settings Saved", "Your settings have been saved successfully!")
     
     def test_connection(self):
-        # Create a new thread for testing connection
-        threading.Thread(target=self._test_connection_thread, daemon=True).start()
+        # Create a new thread for testing connection; Tk values are read here, on the Tk thread
+        threading.Thread(target=self._test_connection_thread, args=(self.get_server_profiles(self.password_var.get()),),
+                         daemon=True).start()
     
-    def _test_connection_thread(self):
-        try:
-            # Update status
-            self.root.after(0, lambda: self.status_var.set("Testing connection..."))
-            
-            # Connect to the server
-            ssh = self._connect_to_server()
-            
-            # Close connection
-            ssh.close()
-            
+    def _test_connection_thread(self, profiles):
+        # Update status
+        self.root.after(0, lambda: self.status_var.set("Testing connection..."))
+        
+        # Connect to every server; the connections stay in the pool for the next search
+        failures = []
+        for name, profile in profiles:
+            try:
+                key = self._get_server_key(profile)
+                client = self.connection_pool.acquire(key, lambda: self._connect_to_server(profile))
+                self.connection_pool.release(key, client)
+            except Exception as e:
+                failures.append(f"{name}: {str(e)}")
+        
+        if not failures:
             # Show success message
-            self.root.after(0, lambda: messagebox.showinfo("Connection Test", "Successfully connected to the server!"))
+            message = ("Successfully connected to the server!" if len(profiles) == 1
+                       else f"Successfully connected to all {len(profiles)} servers!")
+            self.root.after(0, lambda: messagebox.showinfo("Connection Test", message))
             self.root.after(0, lambda: self.status_var.set("Ready"))
-            
-        except Exception as e:
+        else:
             # Show error message
-            self.root.after(0, lambda: messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}"))
+            message = "Failed to connect:\n" + "\n".join(failures)
+            self.root.after(0, lambda: messagebox.showerror("Connection Error", message))
             self.root.after(0, lambda: self.status_var.set("Connection failed"))
     
-    def _connect_to_server(self):
+    def get_server_profiles(self, password=""):
+        """Return (name, options) for [SERVER] and every [SERVER:name] section, in file order.
+        
+        [SERVER] is named after its hostname. The other sections take the
+        options they leave out from [SERVER]. Every profile gets password,
+        which is used with password authentication and never saved.
+        """
+        defaults = dict(self.config['SERVER'], password=password)
+        profiles = [(defaults['hostname'], defaults)]
+        for section in self.config.sections():
+            if section.startswith(SERVER_SECTION_PREFIX):
+                profile = dict(defaults, **self.config[section])
+                profiles.append((section[len(SERVER_SECTION_PREFIX):], profile))
+        return profiles
+    
+    def update_server_choices(self):
+        """Refill the server choice in the search tab from the config."""
+        names = [name for name, _ in self.get_server_profiles()]
+        self.server_choice.config(values=[ALL_SERVERS] + names)
+        if self.server_choice_var.get() not in names:
+            self.server_choice_var.set(ALL_SERVERS)
+    
+    def _get_server_key(self, profile):
+        """Key of a server in the connection pool; changed settings get a connection of their own."""
+        return (profile['hostname'], profile['port'], profile['username'], profile['use_key'], profile['key_path'],
+                profile['password'])
+    
+    def _connect_to_server(self, profile):
         # Create SSH client
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         
         # Get connection details
-        hostname = self.config['SERVER']['hostname']
-        username = self.config['SERVER']['username']
-        port = int(self.config['SERVER']['port'])
-        use_key = self.config.getboolean('SERVER', 'use_key')
+        hostname = profile['hostname']
+        username = profile['username']
+        port = int(profile['port'])
+        use_key = self.config.BOOLEAN_STATES.get(profile['use_key'].lower(), False)
         
         # Connect using key or password
         if use_key:
-            key_path = self.config['SERVER']['key_path']
+            key_path = profile['key_path']
             ssh.connect(hostname, port=port, username=username, key_filename=key_path)
         else:
-            password = self.password_var.get()
+            password = profile['password']
             ssh.connect(hostname, port=port, username=username, password=password)
         
         return ssh
@@ -271,148 +692,288 @@ class RoundcubeLogViewer:
         
         # Get additional parameters
         additional_params = self.params_var.get().strip()
+        match_limit = self.config.getint('SEARCH', 'match_limit', fallback=DEFAULT_MATCH_LIMIT)
+        profiles = self.get_server_profiles(self.password_var.get())
+        if self.server_choice_var.get() != ALL_SERVERS:
+            profiles = [(name, profile) for name, profile in profiles if name == self.server_choice_var.get()]
+        
+        # Start a new search; anything an earlier one still sends is ignored
+        self.search_id += 1
+        self.cancel_event = threading.Event()
+        self.search_btn.config(state='disabled')
+        self.cancel_btn.config(state='normal')
+        self.save_btn.config(state='disabled')
+        self.result_pages = []
+        self.result_count = 0
+        self.show_page(0)
         
         # Create a new thread for searching logs
         threading.Thread(target=self._search_logs_thread, 
-                         args=(email, additional_params), 
+                         args=(self.search_id, profiles, email, additional_params, match_limit, self.cancel_event), 
                          daemon=True).start()
     
-    def find_keyword_positions(self, line):
-        """Find positions of all keywords in the line."""
-        keyword_positions = []
-        
-        for pattern, tag in self.keyword_patterns:
-            for match in re.finditer(pattern, line):
-                keyword_positions.append((match.start(), match.end(), tag))
-        
-        return keyword_positions
+    def cancel_search(self):
+        """Stop the running search; what has been found so far stays in the results."""
+        self.cancel_event.set()
+        self.cancel_btn.config(state='disabled')
+        self.status_var.set("Cancelling search...")
     
-    def apply_color_to_log_line(self, line):
-        """Apply appropriate color tags to log lines based on content."""
-        # Initialize tags list for this line
-        base_tags = []
-        
-        # Convert to lowercase for case-insensitive matching
-        lower_line = line.lower()
-        
-        # Find keyword positions for special highlighting
-        keyword_positions = self.find_keyword_positions(line)
-        
-        # Add appropriate base tags based on content
-        if "error" in lower_line or "failed" in lower_line or "failure" in lower_line:
-            base_tags.append("error")
-        elif "warning" in lower_line or "warn" in lower_line:
-            base_tags.append("warning")
-        elif "info" in lower_line or "notice" in lower_line:
-            base_tags.append("info")
-        elif "success" in lower_line or "completed" in lower_line:
-            base_tags.append("success")
-        
-        # Find email position
-        email = self.email_var.get().strip()
-        email_pos = None
-        if email in line:
-            start_pos = line.find(email)
-            end_pos = start_pos + len(email)
-            email_pos = (start_pos, end_pos)
-        
-        return [(line, base_tags), email_pos, keyword_positions]
+    def build_search_command(self, log_path, email, additional_params, match_limit):
+        """Build the remote grep command, with every value shell-quoted.
+        
+        The email is matched literally and the additional parameters as a
+        grep pattern. The last grep stops after match_limit matches, so the
+        server stops reading the log once enough has been found.
+        """
+        limit = f"-m {int(match_limit)} "
+        if additional_params:
+            return (f"grep -F -- {shlex.quote(email)} {shlex.quote(log_path)}"
+                    f" | grep {limit}-- {shlex.quote(additional_params)}")
+        return f"grep -F {limit}-- {shlex.quote(email)} {shlex.quote(log_path)}"
     
-    def _search_logs_thread(self, email, additional_params):
-        try:
-            # Update UI
-            self.root.after(0, lambda: self.status_var.set("Connecting to server..."))
-            self.root.after(0, lambda: self.search_btn.config(state='disabled'))
-            self.root.after(0, lambda: self.results_text.config(state='normal'))
-            self.root.after(0, lambda: self.results_text.delete(1.0, tk.END))
-            self.root.after(0, lambda: self.results_text.insert(tk.END, "Connecting to server...\n", "info"))
-            self.root.after(0, lambda: self.results_text.config(state='disabled'))
+    def read_lines(self, channel, cancel):
+        """Yield the lines of a channel's output in lists as they arrive, until EOF or cancel is set.
+        
+        An empty list is yielded whenever nothing arrived for
+        CANCEL_CHECK_SECONDS, so the caller can show what it holds so far.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        pending = ""
+        channel.settimeout(CANCEL_CHECK_SECONDS)
+        while not cancel.is_set():
+            try:
+                data = channel.recv(READ_CHUNK_SIZE)
+            except socket.timeout:
+                yield []
+                continue
             
-            # Connect to the server
-            ssh = self._connect_to_server()
+            if not data:
+                pending += decoder.decode(b"", final=True)
+                if pending:
+                    yield [pending]
+                return
             
-            # Update status
-            self.root.after(0, lambda: self.status_var.set("Searching logs..."))
-            self.root.after(0, lambda: self.results_text.config(state='normal'))
-            self.root.after(0, lambda: self.results_text.insert(tk.END, "Connected. Searching logs...\n\n", "success"))
-            self.root.after(0, lambda: self.results_text.config(state='disabled'))
+            # Keep the unfinished last line for the next chunk
+            lines = (pending + decoder.decode(data)).split("\n")
+            pending = lines.pop()
+            yield lines
+    
+    def build_chunks(self, entries, highlighter, first_match, show_hosts=False):
+        """Turn (server name, line) results into (page index, text, tag indices) pieces, one per page they fall on.
+        
+        Runs on the search thread, so the Tk thread only has to insert each
+        piece and add each tag once. Tag indices are Text widget indices
+        within the page, as the widget only ever shows one page. With
+        show_hosts, each line starts with the name of its server.
+        """
+        chunks = []
+        highlights = highlighter.highlight_lines([line for _, line in entries])
+        for number, ((host, line), (base_tag, spans)) in enumerate(zip(entries, highlights), first_match):
+            page_index, line_number = divmod(number, PAGE_LINES)
+            line_number += 1
+            if not chunks or chunks[-1][0] != page_index:
+                chunks.append((page_index, [], {}))
+            _, texts, tags = chunks[-1]
             
-            # Build command
-            log_path = self.config['SERVER']['log_path']
-            command = f"cat {log_path} | grep \"{email}\""
-            if additional_params:
-                command += f" | grep \"{additional_params}\""
+            # Highlights are found in the line itself and moved past the server name
+            prefix = f"[{host}] " if show_hosts else ""
+            texts.append(prefix + line + "\n")
+            if prefix:
+                tags.setdefault("host", []).extend((f"{line_number}.0", f"{line_number}.{len(prefix) - 1}"))
+            if base_tag:
+                tags.setdefault(base_tag, []).extend((f"{line_number}.{len(prefix)}", f"{line_number}.end"))
+            for start, end, tag in spans:
+                tags.setdefault(tag, []).extend((f"{line_number}.{start + len(prefix)}",
+                                                 f"{line_number}.{end + len(prefix)}"))
+        
+        return [(page_index, "".join(texts), tags) for page_index, texts, tags in chunks]
+    
+    def _search_logs_thread(self, search_id, profiles, email, additional_params, match_limit, cancel):
+        # Tells the server threads to stop, once cancelled or enough has been found
+        stop = threading.Event()
+        try:
+            # Search every server at once, each on a thread of its own
+            self.root.after(0, lambda: self.status_var.set(f"Searching {len(profiles)} server(s)..."))
+            results = queue.Queue()
+            for name, profile in profiles:
+                command = self.build_search_command(profile['log_path'], email, additional_params, match_limit)
+                threading.Thread(target=self._search_server_thread,
+                                 args=(name, profile, command, stop, results), daemon=True).start()
             
-            # Execute command
-            stdin, stdout, stderr = ssh.exec_command(command)
+            # Show matches as they arrive, merged into time order, instead of waiting for the whole result.
+            # Every server stops at match_limit, and its first matches are its earliest, so the first
+            # match_limit merged lines are the earliest overall.
+            highlighter = LogHighlighter(self.keyword_patterns, email)
+            merger = LogMerger([name for name, _ in profiles])
+            show_hosts = len(profiles) > 1
+            problems = []
+            failed = 0
+            match_count = 0
+            batch = []
+            last_render = time.monotonic()
+            while merger.open and not cancel.is_set() and match_count + len(batch) < match_limit:
+                try:
+                    name, lines, problem = results.get(timeout=CANCEL_CHECK_SECONDS)
+                    if lines is None:
+                        merger.close(name)
+                        if problem:
+                            errors, server_failed = problem
+                            problems.append(f"{name}: {errors}")
+                            if server_failed:
+                                failed += 1
+                    else:
+                        merger.add(name, lines)
+                except queue.Empty:
+                    pass
+                batch.extend(merger.pop_ready()[:match_limit - match_count - len(batch)])
+                
+                if batch and (len(batch) >= RENDER_BATCH_LINES
+                              or time.monotonic() - last_render >= RENDER_INTERVAL_SECONDS):
+                    chunks = self.build_chunks(batch, highlighter, match_count, show_hosts)
+                    self.root.after(0, self._add_results, search_id, chunks)
+                    match_count += len(batch)
+                    self.root.after(0, lambda count=match_count: self.status_var.set(f"Searching logs... {count} matches"))
+                    batch = []
+                    last_render = time.monotonic()
+            stop.set()
             
-            # Get results
-            results = stdout.read().decode('utf-8')
-            errors = stderr.read().decode('utf-8')
+            # Keep whatever had arrived when the search was cancelled
+            if cancel.is_set():
+                batch.extend(merger.pop_ready(flush=True)[:match_limit - match_count - len(batch)])
+            if batch:
+                self.root.after(0, self._add_results, search_id,
+                                self.build_chunks(batch, highlighter, match_count, show_hosts))
+                match_count += len(batch)
             
-            # Close connection
-            ssh.close()
+            if cancel.is_set():
+                status = f"Search cancelled after {match_count} matches"
+            elif match_count >= match_limit:
+                status = f"Stopped at the limit of {match_limit} matches"
+            elif failed == len(profiles):
+                status = "Error occurred"
+            else:
+                status = f"Search completed: {match_count} matches"
             
-            # Display results
-            self.root.after(0, lambda: self.results_text.config(state='normal'))
+            # Report servers that failed or wrote errors; the others' results are still shown
+            if failed == len(profiles):
+                message = "Search failed:\n" + "\n".join(problems)
+                self.root.after(0, lambda: messagebox.showerror("Search Error", message[:2000]))
+            elif problems:
+                message = "\n".join(problems)
+                self.root.after(0, lambda: messagebox.showwarning("Search Errors", message[:2000]))
             
-            if errors:
-                self.root.after(0, lambda: self.results_text.insert(tk.END, "ERRORS:\n", "error"))
-                self.root.after(0, lambda: self.results_text.insert(tk.END, f"{errors}\n\n"))
+            self.root.after(0, lambda: self._finish_search(search_id, status))
             
-            if results:
-                self.root.after(0, lambda: self.results_text.insert(tk.END, "RESULTS:\n", "header"))
-                
-                # Process each line and apply appropriate coloring
-                lines = results.splitlines()
-                for i, line in enumerate(lines):
-                    if line.strip():
-                        colored_line, email_pos, keyword_positions = self.apply_color_to_log_line(line)
-                        
-                        # Insert the line with its base tags
-                        line_text, base_tags = colored_line
-                        position = self.results_text.index(tk.END)
-                        self.root.after(0, lambda pos=position, txt=line_text+"\n", tgs=base_tags: 
-                                       self.results_text.insert(pos, txt, tgs))
-                        
-                        # Get the line number for tag positions
-                        line_number = int(float(position)) - 1
-                        
-                        # Apply email highlight tag if email was found
-                        if email_pos:
-                            start, end = email_pos
-                            self.root.after(0, lambda ln=line_number, s=start, e=end: 
-                                           self.results_text.tag_add("highlight", 
-                                                                   f"{ln}.{s}", 
-                                                                   f"{ln}.{e}"))
-                        
-                        # Apply keyword tags
-                        for start, end, tag in keyword_positions:
-                            self.root.after(0, lambda ln=line_number, s=start, e=end, t=tag: 
-                                           self.results_text.tag_add(t, 
-                                                                   f"{ln}.{s}", 
-                                                                   f"{ln}.{e}"))
-                
-                self.root.after(0, lambda: self.save_btn.config(state='normal'))
-            else:
-                self.root.after(0, lambda: self.results_text.insert(tk.END, "No matching log entries found.", "info"))
-                self.root.after(0, lambda: self.save_btn.config(state='disabled'))
+        except Exception as e:
+            # Show error message
+            message = f"Search failed: {str(e)}"
+            self.root.after(0, lambda: self._finish_search(search_id, "Error occurred"))
+            self.root.after(0, lambda: messagebox.showerror("Search Error", message))
+        
+        finally:
+            stop.set()
+    
+    def _search_server_thread(self, name, profile, command, stop, results):
+        """Run the search command on one server, putting its output lines on the results queue.
+        
+        Puts (name, lines, None) for each batch of lines, then
+        (name, None, problem) once done. problem is None, or the error text
+        and whether the whole search of this server failed.
+        """
+        key = self._get_server_key(profile)
+        stdout = None
+        problem = None
+        try:
+            # Execute command on the pooled connection, connecting first if there is none
+            client, stdin, stdout, stderr = self.connection_pool.exec_command(
+                key, lambda: self._connect_to_server(profile), command)
             
-            self.root.after(0, lambda: self.results_text.config(state='disabled'))
-            self.root.after(0, lambda: self.status_var.set("Search completed"))
-            self.root.after(0, lambda: self.search_btn.config(state='normal'))
+            for lines in self.read_lines(stdout.channel, stop):
+                lines = [line.rstrip("\r") for line in lines if line.strip()]
+                if lines:
+                    results.put((name, lines, None))
+            
+            if not stop.is_set():
+                # The command has finished, so anything it reported on stderr is complete
+                stdout.channel.settimeout(None)
+                errors = stderr.read().decode('utf-8', errors='replace').strip()
+                if errors:
+                    problem = (errors, False)
             
         except Exception as e:
-            # Show error message
-            self.root.after(0, lambda: self.results_text.config(state='normal'))
-            self.root.after(0, lambda: self.results_text.insert(tk.END, f"\nERROR: {str(e)}", "error"))
-            self.root.after(0, lambda: self.results_text.config(state='disabled'))
-            self.root.after(0, lambda: self.status_var.set("Error occurred"))
-            self.root.after(0, lambda: self.search_btn.config(state='normal'))
+            problem = (str(e), True)
+        
+        finally:
+            # Closing the channel also stops a grep that is still running; the connection stays open
+            if stdout:
+                stdout.channel.close()
+                self.connection_pool.release(key, client)
+            results.put((name, None, problem))
+    
+    def _add_results(self, search_id, chunks):
+        """Store pieces made by build_chunks, showing those on the current page. Call on the Tk thread."""
+        if search_id != self.search_id:
+            return
+        for page_index, text, tags in chunks:
+            if page_index == len(self.result_pages):
+                self.result_pages.append(([], {}))
+            texts, page_tags = self.result_pages[page_index]
+            texts.append(text)
+            for tag, indices in tags.items():
+                page_tags.setdefault(tag, []).extend(indices)
+            self.result_count += text.count("\n")
+            
+            if page_index == self.page_index:
+                self.insert_chunk(text, tags)
+        self.update_page_controls()
+    
+    def insert_chunk(self, text, tags):
+        """Append text to the results with one tag_add per tag. Call on the Tk thread."""
+        self.results_text.config(state='normal')
+        self.results_text.insert(tk.END, text)
+        for tag, indices in tags.items():
+            self.results_text.tag_add(tag, *indices)
+        self.results_text.config(state='disabled')
+    
+    def show_page(self, page_index):
+        """Replace the Text widget's contents with one page of the results."""
+        self.page_index = max(0, min(page_index, len(self.result_pages) - 1))
+        self.results_text.config(state='normal')
+        self.results_text.delete(1.0, tk.END)
+        self.results_text.config(state='disabled')
+        if self.result_pages:
+            texts, tags = self.result_pages[self.page_index]
+            self.insert_chunk("".join(texts), tags)
+        self.update_page_controls()
+    
+    def update_page_controls(self):
+        page_count = max(1, len(self.result_pages))
+        self.page_var.set(f"Page {self.page_index + 1} of {page_count} ({self.result_count} matches)")
+        self.prev_btn.config(state='normal' if self.page_index > 0 else 'disabled')
+        self.next_btn.config(state='normal' if self.page_index < page_count - 1 else 'disabled')
+    
+    def _finish_search(self, search_id, status):
+        """Restore the buttons once a search has ended. Call on the Tk thread."""
+        if search_id != self.search_id:
+            return
+        self.status_var.set(status)
+        self.search_btn.config(state='normal')
+        self.cancel_btn.config(state='disabled')
+        self.save_btn.config(state='normal' if self.result_count else 'disabled')
+        if not self.result_count:
+            self.results_text.config(state='normal')
+            self.results_text.insert(tk.END, "No matching log entries found.", "info")
+            self.results_text.config(state='disabled')
+    
+    def on_close(self):
+        """Close the pooled connections along with the window."""
+        self.cancel_event.set()
+        self.connection_pool.close()
+        self.root.destroy()
     
     def save_results(self):
-        # Get current results
-        results = self.results_text.get(1.0, tk.END)
+        # Get every page of the results, not just the one shown
+        results = "".join(text for texts, _ in self.result_pages for text in texts)
         
         # Generate filename with timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")